@@ -0,0 +1,231 @@
+# admision.py
+"""Control de admisión: límites de concurrencia por clase de ruta y límite de intentos de login.
+
+Cada clase (login, lecturas, escrituras y exportación de productos) deja pasar a lo sumo
+`limite` peticiones a la vez; las demás esperan en una cola acotada y, si no
+entran antes del plazo, reciben 503 con Retry-After. El plazo también limita la
+espera por una conexión del pool (database.plazo_conexion): lo admitido que no
+consigue conexión a tiempo recibe el mismo 503 en lugar de esperar DB_POOL_TIMEOUT.
+Así, bajo sobrecarga, el tiempo que una petición pasa esperando queda acotado por
+el plazo de su clase; lo que tarde la base de datos en responder no lo acota.
+
+Los límites por defecto salen de DB_POOL_SIZE, para que la cola se forme en la
+compuerta y no en el pool. La exportación tiene su propia clase: retiene una
+conexión durante toda la descarga, así que se admiten pocas a la vez y esperan
+más, en lugar de agotar el pool y dejar sin conexión a las lecturas cortas.
+"""
+from collections import OrderedDict
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+import asyncio
+import math
+import time
+import os
+import database
+
+load_dotenv()
+
+
+def _entero(nombre, defecto):
+    return int(os.getenv(nombre, str(defecto)))
+
+
+def _segundos(nombre, defecto):
+    return float(os.getenv(nombre, str(defecto)))
+
+
+# Concurrencia (0 = sin límite), peticiones en espera y segundos máximos de espera por clase
+ADMISSION_LOGIN_CONCURRENCY = _entero("ADMISSION_LOGIN_CONCURRENCY", 8)
+ADMISSION_LOGIN_QUEUE = _entero("ADMISSION_LOGIN_QUEUE", 32)
+ADMISSION_LOGIN_WAIT = _segundos("ADMISSION_LOGIN_WAIT", 2)
+ADMISSION_READ_CONCURRENCY = _entero("ADMISSION_READ_CONCURRENCY", 2 * database.POOL_SIZE)
+ADMISSION_READ_QUEUE = _entero("ADMISSION_READ_QUEUE", 256)
+ADMISSION_READ_WAIT = _segundos("ADMISSION_READ_WAIT", 1)
+ADMISSION_WRITE_CONCURRENCY = _entero("ADMISSION_WRITE_CONCURRENCY", database.POOL_SIZE)
+ADMISSION_WRITE_QUEUE = _entero("ADMISSION_WRITE_QUEUE", 64)
+ADMISSION_WRITE_WAIT = _segundos("ADMISSION_WRITE_WAIT", 2)
+ADMISSION_EXPORT_CONCURRENCY = _entero("ADMISSION_EXPORT_CONCURRENCY", max(1, database.POOL_SIZE // 4))
+ADMISSION_EXPORT_QUEUE = _entero("ADMISSION_EXPORT_QUEUE", 32)
+ADMISSION_EXPORT_WAIT = _segundos("ADMISSION_EXPORT_WAIT", 10)
+
+# Intentos de login por minuto y ráfaga, por IP y por cuenta (0 = sin límite)
+LOGIN_IP_PER_MINUTE = _segundos("LOGIN_IP_PER_MINUTE", 30)
+LOGIN_IP_BURST = _entero("LOGIN_IP_BURST", 10)
+LOGIN_ACCOUNT_PER_MINUTE = _segundos("LOGIN_ACCOUNT_PER_MINUTE", 10)
+LOGIN_ACCOUNT_BURST = _entero("LOGIN_ACCOUNT_BURST", 5)
+CUBETAS_MAX = 10000  # Claves recordadas por limitador; se olvidan primero las menos recientes
+
+
+class Compuerta:
+    """Semáforo con cola acotada y plazo de espera."""
+
+    def __init__(self, nombre, limite, cola, espera):
+        self.nombre = nombre
+        self.limite = limite
+        self.cola = cola
+        self.espera = espera
+        self._semaforo = asyncio.Semaphore(limite) if limite > 0 else None
+        self.activas = 0
+        self.en_cola = 0
+        self.admitidas = 0
+        self.rechazadas_cola = 0
+        self.rechazadas_plazo = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    async def entrar(self):
+        """True si la petición puede pasar; False si se descarta (cola llena o plazo vencido)."""
+        if self._semaforo is None:
+            return True
+        if self._semaforo.locked():
+            if self.en_cola >= self.cola:
+                # Rechazo inmediato: esperar no serviría de nada
+                self.rechazadas_cola += 1
+                return False
+            inicio = time.monotonic()
+            self.en_cola += 1
+            try:
+                await asyncio.wait_for(self._semaforo.acquire(), self.espera)
+            except asyncio.TimeoutError:
+                self.rechazadas_plazo += 1
+                return False
+            finally:
+                self.en_cola -= 1
+            espera = time.monotonic() - inicio
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+        else:
+            await self._semaforo.acquire()
+        self.activas += 1
+        self.admitidas += 1
+        return True
+
+    def salir(self):
+        if self._semaforo is not None:
+            self.activas -= 1
+            self._semaforo.release()
+
+    def estadisticas(self):
+        return {
+            "limite": self.limite,
+            "cola_max": self.cola,
+            "espera_max_s": self.espera,
+            "activas": self.activas,
+            "en_cola": self.en_cola,
+            "admitidas": self.admitidas,
+            "rechazadas_cola": self.rechazadas_cola,
+            "rechazadas_plazo": self.rechazadas_plazo,
+            "espera_promedio_ms": round(self._espera_total / self.admitidas * 1000, 3) if self.admitidas else 0.0,
+            "espera_max_ms": round(self._espera_max * 1000, 3),
+        }
+
+
+compuertas = {
+    "login": Compuerta("login", ADMISSION_LOGIN_CONCURRENCY, ADMISSION_LOGIN_QUEUE, ADMISSION_LOGIN_WAIT),
+    "lectura": Compuerta("lectura", ADMISSION_READ_CONCURRENCY, ADMISSION_READ_QUEUE, ADMISSION_READ_WAIT),
+    "escritura": Compuerta("escritura", ADMISSION_WRITE_CONCURRENCY, ADMISSION_WRITE_QUEUE, ADMISSION_WRITE_WAIT),
+    "exportacion": Compuerta("exportacion", ADMISSION_EXPORT_CONCURRENCY, ADMISSION_EXPORT_QUEUE,
+                             ADMISSION_EXPORT_WAIT),
+}
+
+
+def clasificar(metodo, ruta):
+    """Clase de admisión de una petición, o None si no se limita."""
+    if ruta == "/usuarios/login" and metodo == "POST":
+        return "login"
+    if not ruta.startswith("/productos"):
+        return None
+    if ruta.rstrip("/") == "/productos/events":
+        return None  # Conexiones largas sin base de datos: ocuparían un lugar indefinidamente
+    if ruta.rstrip("/") == "/productos/export":
+        return "exportacion"
+    return "lectura" if metodo in ("GET", "HEAD") else "escritura"
+
+
+class MiddlewareAdmision:
+    """Middleware ASGI: descarta con 503 lo que excede la concurrencia de su clase."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        clase = clasificar(scope["method"], scope["path"])
+        if clase is None:
+            return await self.app(scope, receive, send)
+        compuerta = compuertas[clase]
+        inicio = time.monotonic()
+        if not await compuerta.entrar():
+            respuesta = JSONResponse(
+                status_code=503,
+                content={"error": "Servidor saturado, intente de nuevo"},
+                headers={"Retry-After": "1"},
+            )
+            return await respuesta(scope, receive, send)
+        # Lo que quede del plazo es lo máximo que se espera por una conexión
+        plazo = database.plazo_conexion.set(inicio + compuerta.espera if compuerta.limite > 0 else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            database.plazo_conexion.reset(plazo)
+            compuerta.salir()
+
+
+# --- Límite de intentos de login (token bucket) ---
+class Limitador:
+    """Un token bucket por clave: `rafaga` intentos seguidos y `por_minuto` de reposición."""
+
+    def __init__(self, por_minuto, rafaga, maximo=CUBETAS_MAX):
+        self.tasa = por_minuto / 60
+        self.rafaga = rafaga
+        self.maximo = maximo
+        self._cubetas = OrderedDict()  # clave -> (fichas, instante)
+        self.rechazos = 0
+
+    def consumir(self, clave):
+        """0 si se permite el intento; si no, segundos hasta la próxima ficha."""
+        if self.tasa <= 0:
+            return 0
+        ahora = time.monotonic()
+        fichas, instante = self._cubetas.pop(clave, (self.rafaga, ahora))
+        fichas = min(self.rafaga, fichas + (ahora - instante) * self.tasa)
+        if fichas >= 1:
+            fichas -= 1
+            espera = 0
+        else:
+            espera = (1 - fichas) / self.tasa
+            self.rechazos += 1
+        self._cubetas[clave] = (fichas, ahora)
+        if len(self._cubetas) > self.maximo:
+            self._cubetas.popitem(last=False)
+        return espera
+
+    def estadisticas(self):
+        return {"por_minuto": self.tasa * 60, "rafaga": self.rafaga, "claves": len(self._cubetas),
+                "rechazos": self.rechazos}
+
+
+limite_ip = Limitador(LOGIN_IP_PER_MINUTE, LOGIN_IP_BURST)
+limite_cuenta = Limitador(LOGIN_ACCOUNT_PER_MINUTE, LOGIN_ACCOUNT_BURST)
+
+
+def limitar_login(ip, email):
+    """None si el intento puede seguir; si no, la respuesta 429 con Retry-After."""
+    # Un intento ya frenado por IP no gasta fichas de la cuenta: otro no puede bloquearla tan fácil
+    espera = limite_ip.consumir(ip) or limite_cuenta.consumir(email.strip().lower())
+    if not espera:
+        return None
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Demasiados intentos de login, intente más tarde"},
+        headers={"Retry-After": str(math.ceil(espera))},
+    )
+
+
+def estadisticas():
+    return {
+        **{nombre: compuerta.estadisticas() for nombre, compuerta in compuertas.items()},
+        "login_ip": limite_ip.estadisticas(),
+        "login_cuenta": limite_cuenta.estadisticas(),
+    }
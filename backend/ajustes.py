@@ -0,0 +1,171 @@
+# ajustes.py
+"""Ajustes de stock con un delta (POST /productos/{id}/ajuste).
+
+Sin agrupar, cada ajuste es un único UPDATE condicional: cantidad = cantidad + delta
+solo si no queda negativa. Con STOCK_COALESCE_MS > 0 los ajustes que llegan dentro
+de la ventana se aplican juntos: una transacción bloquea las filas afectadas, decide
+cada ajuste en orden de llegada y escribe un solo UPDATE por producto. Cada petición
+sigue recibiendo su propio resultado, y una fila muy vendida se bloquea una vez por
+ventana en lugar de una vez por venta.
+"""
+from collections import namedtuple
+from dotenv import load_dotenv
+import asyncio
+import os
+from database import conexion
+import repositorio
+
+load_dotenv()
+
+STOCK_COALESCE_MS = float(os.getenv("STOCK_COALESCE_MS", "0"))     # Ventana de agrupación; 0 = un UPDATE por ajuste
+STOCK_COALESCE_MAX = int(os.getenv("STOCK_COALESCE_MAX", "1000"))  # Ajustes pendientes que adelantan la escritura
+
+# estado: aplicado | stock_insuficiente | fuera_de_rango | no_encontrado; cantidad: stock resultante (o el disponible)
+Ajuste = namedtuple("Ajuste", ["estado", "cantidad"])
+
+NO_ENCONTRADO = Ajuste("no_encontrado", None)
+
+
+def _decidir(cantidad, delta):
+    """Una venta no puede dejar el stock negativo ni una reposición pasarlo de CANTIDAD_MAX."""
+    if delta < 0 and cantidad + delta < 0:
+        return Ajuste("stock_insuficiente", cantidad)
+    if cantidad + delta > repositorio.CANTIDAD_MAX:
+        return Ajuste("fuera_de_rango", cantidad)
+    return Ajuste("aplicado", cantidad + delta)
+
+
+async def _aplicar(id, delta):
+    async with conexion() as db:
+        try:
+            resultado = await repositorio.ajustar_stock(db, id, delta)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        if resultado.rowcount:
+            return Ajuste("aplicado", resultado.lastrowid)
+        # Camino de error: distinguir stock insuficiente o excedido de producto inexistente
+        disponible = await repositorio.stock_productos(db, [id])
+    if not disponible:
+        return NO_ENCONTRADO
+    return Ajuste("stock_insuficiente" if delta < 0 else "fuera_de_rango", disponible[id])
+
+
+class Agrupador:
+    """Junta los ajustes de una ventana y los escribe en una sola transacción."""
+
+    def __init__(self, ventana, maximo):
+        self.ventana = ventana
+        self.maximo = maximo
+        self._pendientes = {}   # id -> [(delta, futuro)] en orden de llegada
+        self._cantidad = 0
+        self._temporizador = None
+        self._tareas = set()
+        # Una escritura a la vez: lo que llega mientras tanto se agrupa en la siguiente
+        self._lock = asyncio.Lock()
+        self.ajustes = 0
+        self.escrituras = 0
+        self.updates = 0
+        self.rechazados = 0
+        self.errores = 0
+
+    async def ajustar(self, id, delta):
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes.setdefault(id, []).append((delta, futuro))
+        self._cantidad += 1
+        self.ajustes += 1
+        if self._cantidad >= self.maximo:
+            self._vaciar()
+        elif self._temporizador is None:
+            self._temporizador = asyncio.get_running_loop().call_later(self.ventana, self._vaciar)
+        return await futuro
+
+    def _vaciar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        pendientes, self._pendientes, self._cantidad = self._pendientes, {}, 0
+        if pendientes:
+            tarea = asyncio.create_task(self._escribir(pendientes))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+
+    async def _escribir(self, pendientes):
+        # Ids en orden: dos workers que agrupan los mismos productos bloquean en el mismo orden
+        ids = sorted(pendientes)
+        resultados = []
+        try:
+            async with self._lock, conexion() as db:
+                try:
+                    await db.begin()  # El FOR UPDATE tiene que quedar dentro de la transacción
+                    disponibles = await repositorio.stock_productos(db, ids, bloquear=True)
+                    netos = []
+                    for id in ids:
+                        cantidad = disponibles.get(id)
+                        for delta, futuro in pendientes[id]:
+                            ajuste = NO_ENCONTRADO if cantidad is None else _decidir(cantidad, delta)
+                            if ajuste.estado == "aplicado":
+                                cantidad = ajuste.cantidad
+                            resultados.append((futuro, ajuste))
+                        if cantidad is not None and cantidad != disponibles[id]:
+                            netos.append((cantidad - disponibles[id], id))
+                    if netos:
+                        await repositorio.sumar_stock(db, netos)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
+                    raise
+        except Exception as e:
+            self.errores += 1
+            for id in ids:
+                for _, futuro in pendientes[id]:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+            return
+        self.escrituras += 1
+        self.updates += len(netos)
+        for futuro, ajuste in resultados:
+            if ajuste.estado in ("stock_insuficiente", "fuera_de_rango"):
+                self.rechazados += 1
+            # La petición pudo cancelarse (cliente desconectado): el ajuste igual quedó aplicado
+            if not futuro.done():
+                futuro.set_result(ajuste)
+
+    async def cerrar(self):
+        """Escribe lo pendiente antes de cerrar el pool."""
+        self._vaciar()
+        if self._tareas:
+            await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    def estadisticas(self):
+        return {
+            "ventana_ms": self.ventana * 1000,
+            "ajustes": self.ajustes,
+            "pendientes": self._cantidad,
+            "escrituras": self.escrituras,
+            "updates": self.updates,
+            "rechazados": self.rechazados,
+            "errores": self.errores,
+        }
+
+
+_agrupador = Agrupador(STOCK_COALESCE_MS / 1000, STOCK_COALESCE_MAX) if STOCK_COALESCE_MS > 0 else None
+
+
+async def ajustar(id, delta):
+    """Aplica `delta` al stock del producto `id` y devuelve un Ajuste."""
+    if _agrupador is None:
+        return await _aplicar(id, delta)
+    return await _agrupador.ajustar(id, delta)
+
+
+async def cerrar():
+    if _agrupador is not None:
+        await _agrupador.cerrar()
+
+
+def estadisticas():
+    if _agrupador is None:
+        return {"agrupacion": False}
+    return {"agrupacion": True, **_agrupador.estadisticas()}
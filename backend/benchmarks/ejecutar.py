@@ -0,0 +1,224 @@
+# benchmarks/ejecutar.py
+"""Benchmark de la API completa contra una base SQLite local (sin contenedor de MySQL).
+
+Desde backend/:
+
+    python -m benchmarks.ejecutar                          # mide y compara con benchmarks/baseline.json
+    python -m benchmarks.ejecutar --tamanos 1000,100000    # catálogos de distinto tamaño
+    python -m benchmarks.ejecutar --guardar-baseline       # la corrida actual pasa a ser la referencia
+
+Para cada tamaño se crea una base nueva, se siembran los productos y usuarios, se
+levanta `main:app` en el proceso (httpx + ASGI, sin red) y cada escenario lanza
+`--peticiones` peticiones con `--concurrencia` clientes simultáneos. Se informa
+throughput y p50/p95/p99 por endpoint; el código de salida es 1 si alguno empeoró
+más que los umbrales respecto de la baseline. La baseline solo es comparable con
+corridas en la misma máquina: regenérela al cambiar de equipo.
+
+Requiere httpx (pip install httpx), que no forma parte de requirements.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(DIRECTORIO, "baseline.json")
+
+
+def _argumentos():
+    p = argparse.ArgumentParser(description="Benchmark de latencia y throughput de la API")
+    p.add_argument("--tamanos", default="1000,10000", help="Tamaños de catálogo separados por coma")
+    p.add_argument("--peticiones", type=int, default=200, help="Peticiones medidas por escenario")
+    p.add_argument("--concurrencia", type=int, default=16, help="Clientes simultáneos")
+    p.add_argument("--calentamiento", type=int, default=10, help="Peticiones no medidas antes de cada escenario")
+    p.add_argument("--solo", default=None, help="Solo los escenarios cuyo nombre contiene este texto")
+    p.add_argument("--sin-cache", action="store_true", help="Desactiva el cache de productos (CACHE_ENABLED=false)")
+    p.add_argument("--bcrypt-rounds", type=int, default=4, help="Costo de bcrypt para registro y login")
+    p.add_argument("--salida", default=os.path.join(DIRECTORIO, "resultados.json"))
+    p.add_argument("--baseline", default=BASELINE)
+    p.add_argument("--guardar-baseline", action="store_true")
+    p.add_argument("--umbral", type=float, default=0.25, help="Empeoramiento relativo tolerado (0.25 = 25%%)")
+    p.add_argument("--umbral-ms", type=float, default=2.0, help="Aumento mínimo de p95 en ms para contar como regresión")
+    return p.parse_args()
+
+
+def _configurar_entorno(args):
+    # Se lee al importar los módulos de la aplicación: debe ir antes de importar main
+    os.environ.update(
+        DB_ENGINE="sync",
+        SEARCH_ENGINE="memoria",
+        CACHE_ENABLED="false" if args.sin_cache else "true",
+        BCRYPT_ROUNDS=str(args.bcrypt_rounds),
+        STATS_RECONCILE_INTERVAL="0",
+        # SQLite no tiene information_schema.innodb_trx: el feed de cambios usa solo el margen
+        CHANGES_TRACK_TRANSACTIONS="false",
+        # Todos los logins salen de la misma IP y cuenta: el límite de intentos falsearía el escenario
+        LOGIN_IP_PER_MINUTE="0",
+        LOGIN_ACCOUNT_PER_MINUTE="0",
+        SESSION_SECRET=os.getenv("SESSION_SECRET", "benchmark"),
+    )
+
+
+def _percentil(cuantiles, p):
+    return round(cuantiles[p - 1] * 1000, 3) if cuantiles else None
+
+
+async def _medir(ctx, escenario, peticiones, concurrencia):
+    latencias = []
+    errores = 0
+    pendientes = iter(range(peticiones))
+
+    async def cliente():
+        nonlocal errores
+        for i in pendientes:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await escenario.peticion(ctx, i)
+                fallo = respuesta.status_code >= 400
+            except Exception:
+                fallo = True
+            latencias.append(time.perf_counter() - inicio)
+            errores += fallo
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    cuantiles = statistics.quantiles(latencias, n=100, method="inclusive") if len(latencias) > 1 else latencias * 99
+    return {
+        "peticiones": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / duracion, 1),
+        "p50_ms": _percentil(cuantiles, 50),
+        "p95_ms": _percentil(cuantiles, 95),
+        "p99_ms": _percentil(cuantiles, 99),
+    }
+
+
+async def _ejecutar_tamano(args, tamano, escenarios):
+    import httpx
+    import cache
+    from main import app
+    from benchmarks import sqlite_local
+    from benchmarks.escenarios import Contexto, preparar, sembrar
+
+    ruta = sqlite_local.crear_base(tempfile.mkdtemp(prefix=f"bench_{tamano}_"))
+    sqlite_local.instalar(ruta)
+    sembrar(ruta, tamano)
+    await cache.cache.limpiar()
+    await cache.invalidar()  # Nada cacheado del tamaño anterior; el índice de búsqueda se reconstruye
+
+    resultados = {}
+    async with app.router.lifespan_context(app):
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+            ctx = Contexto(cliente, tamano, app=app)
+            await preparar(ctx)
+            for escenario in escenarios:
+                if args.calentamiento:
+                    await _medir(ctx, escenario, args.calentamiento, min(args.concurrencia, args.calentamiento))
+                resultados[escenario.nombre] = r = await _medir(ctx, escenario, args.peticiones, args.concurrencia)
+                print(f"  {escenario.nombre:<28} {r['rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f}  "
+                      f"p95 {r['p95_ms']:>8.2f}  p99 {r['p99_ms']:>8.2f} ms  errores {r['errores']}")
+    return resultados
+
+
+def _rutas_sin_escenario(escenarios):
+    from fastapi.routing import APIRoute
+    from main import app
+
+    cubiertas = {e.ruta for e in escenarios}
+    return sorted(
+        f"{metodo} {ruta.path}"
+        for ruta in app.routes if isinstance(ruta, APIRoute)
+        for metodo in ruta.methods
+        if f"{metodo} {ruta.path}" not in cubiertas
+    )
+
+
+def comparar(actual, base, umbral, umbral_ms):
+    """Regresiones de `actual` frente a `base`: p95 más alto o throughput más bajo que lo tolerado.
+
+    Un escenario sin entrada en la baseline también cuenta: si no, una ruta nueva
+    nunca podría reportar una regresión. Se corrige con --guardar-baseline.
+    """
+    regresiones = []
+    for tamano, endpoints in actual["resultados"].items():
+        for nombre, r in endpoints.items():
+            b = base.get("resultados", {}).get(tamano, {}).get(nombre)
+            if b is None:
+                regresiones.append(f"[{tamano}] {nombre}: sin entrada en la baseline")
+                continue
+            if r["p95_ms"] > b["p95_ms"] * (1 + umbral) and r["p95_ms"] - b["p95_ms"] > umbral_ms:
+                regresiones.append(f"[{tamano}] {nombre}: p95 {b['p95_ms']:.2f} -> {r['p95_ms']:.2f} ms")
+            if r["rps"] < b["rps"] * (1 - umbral):
+                regresiones.append(f"[{tamano}] {nombre}: throughput {b['rps']:.1f} -> {r['rps']:.1f} req/s")
+            if r["errores"] > b["errores"]:
+                regresiones.append(f"[{tamano}] {nombre}: errores {b['errores']} -> {r['errores']}")
+    return regresiones
+
+
+def main():
+    args = _argumentos()
+    _configurar_entorno(args)
+    from benchmarks.escenarios import ESCENARIOS
+
+    escenarios = [e for e in ESCENARIOS if not args.solo or args.solo in e.nombre]
+    faltantes = _rutas_sin_escenario(ESCENARIOS)
+    if faltantes:
+        print("Rutas sin escenario de benchmark:", ", ".join(faltantes))
+
+    informe = {
+        "meta": {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "peticiones": args.peticiones,
+            "concurrencia": args.concurrencia,
+            "cache": not args.sin_cache,
+            "bcrypt_rounds": args.bcrypt_rounds,
+        },
+        "resultados": {},
+    }
+
+    async def ejecutar_todos():
+        # Un solo event loop: los semáforos y locks de la aplicación quedan ligados al primero que los usa
+        for tamano in (int(t) for t in args.tamanos.split(",")):
+            print(f"Catálogo de {tamano} productos")
+            informe["resultados"][str(tamano)] = await _ejecutar_tamano(args, tamano, escenarios)
+
+    asyncio.run(ejecutar_todos())
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.guardar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"Baseline actualizada: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("Sin baseline para comparar (use --guardar-baseline)")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        base = json.load(f)
+    for campo in ("cache", "cpus", "plataforma", "concurrencia"):
+        if base.get("meta", {}).get(campo) != informe["meta"][campo]:
+            print(f"Aviso: la baseline se midió con otro valor de '{campo}'")
+    regresiones = comparar(informe, base, args.umbral, args.umbral_ms)
+    for regresion in regresiones:
+        print("REGRESIÓN", regresion)
+    print("Sin regresiones respecto de la baseline" if not regresiones else f"{len(regresiones)} regresiones")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
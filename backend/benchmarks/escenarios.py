@@ -0,0 +1,272 @@
+# benchmarks/escenarios.py
+"""Datos de prueba y una petición representativa por ruta de la API."""
+from collections import deque, namedtuple
+import asyncio
+import httpx
+import itertools
+import random
+import seguridad
+from benchmarks import sqlite_local
+
+PASSWORD = "benchmark1234"
+
+PALABRAS = [
+    "camisa", "pantalon", "zapato", "chaqueta", "vestido", "bolso", "cinturon", "gorra",
+    "mesa", "silla", "lampara", "estante", "alfombra", "cojin", "espejo", "reloj",
+    "azul", "rojo", "verde", "negro", "blanco", "gris", "dorado", "plateado",
+    "algodon", "madera", "metal", "cuero", "lana", "seda", "vidrio", "bambu",
+    "grande", "mediano", "pequeno", "clasico", "moderno", "premium", "oferta", "importado",
+]
+
+# nombre: etiqueta del resultado; ruta: "MÉTODO /plantilla" de la ruta de FastAPI que cubre;
+# peticion: corutina (contexto, i) -> httpx.Response
+Escenario = namedtuple("Escenario", ["nombre", "ruta", "peticion"])
+
+
+class Contexto:
+    """Estado compartido por los escenarios de un tamaño de catálogo."""
+
+    def __init__(self, cliente, tamano, semilla=1234, app=None):
+        self.cliente = cliente
+        self.app = app
+        self.tamano = tamano
+        self.azar = random.Random(semilla)
+        self.email = "bench0@ejemplo.com"
+        self.token = None
+        self.cursor = None
+        self.desde = None             # Token de /productos/changes anterior a las escrituras
+        self.creados = deque()        # Ids de POST /productos/, los consume DELETE /productos/{id}
+        self.creados_bulk = deque()   # Ids de POST /productos/bulk, los consume DELETE /productos/bulk
+        self._emails = itertools.count()
+
+    def id_existente(self):
+        return self.azar.randint(1, self.tamano)
+
+    def texto(self, palabras):
+        return " ".join(self.azar.choice(PALABRAS) for _ in range(palabras))
+
+    def producto(self):
+        return {
+            "nombre": self.texto(2),
+            "descripcion": self.texto(6),
+            "precio": round(self.azar.uniform(1, 1500), 2),
+            "cantidad": self.azar.randint(0, 200),
+        }
+
+    def email_nuevo(self):
+        return f"nuevo{next(self._emails)}@ejemplo.com"
+
+
+def sembrar(ruta, tamano, semilla=1234):
+    """Inserta `tamano` productos y tamano // 10 usuarios (al menos uno) directo en SQLite."""
+    azar = random.Random(semilla)
+    texto = lambda n: " ".join(azar.choice(PALABRAS) for _ in range(n))
+    productos = [
+        (f"{texto(2)} {i}", texto(8), round(azar.uniform(1, 1500), 2), azar.randint(0, 200))
+        for i in range(tamano)
+    ]
+    # Un único hash: bcrypt es caro y todos comparten la contraseña
+    hashed = seguridad.hashear(PASSWORD)
+    usuarios = [(f"Usuario {i}", f"bench{i}@ejemplo.com", hashed) for i in range(max(1, tamano // 10))]
+    conn = sqlite_local.conectar(ruta)
+    try:
+        conn.executemany(
+            "INSERT INTO productos (nombre, descripcion, precio, cantidad) VALUES (?, ?, ?, ?)", productos
+        )
+        conn.executemany("INSERT INTO usuarios (nombre, email, password) VALUES (?, ?, ?)", usuarios)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def preparar(ctx):
+    """Obtiene lo que algunos escenarios necesitan de antemano (token, cursor)."""
+    r = await ctx.cliente.post("/usuarios/login", json={"email": ctx.email, "password": PASSWORD})
+    r.raise_for_status()
+    ctx.token = r.json()["token"]
+    r = await ctx.cliente.get("/productos/", params={"limit": 50})
+    r.raise_for_status()
+    ctx.cursor = r.headers.get("X-Next-Cursor")
+    r = await ctx.cliente.get("/productos/changes")
+    r.raise_for_status()
+    ctx.desde = r.json()["token"]
+
+
+# --- Peticiones ---
+async def _raiz(ctx, i):
+    return await ctx.cliente.get("/")
+
+
+async def _lista(ctx, i):
+    return await ctx.cliente.get("/productos/")
+
+
+async def _lista_filtrada(ctx, i):
+    minimo = ctx.azar.choice([0, 10, 50, 100, 500])
+    return await ctx.cliente.get("/productos/", params={"precio_min": minimo, "stock_min": 1, "orden": "-precio", "limit": 50})
+
+
+async def _lista_cursor(ctx, i):
+    return await ctx.cliente.get("/productos/", params={"limit": 50, "after": ctx.cursor})
+
+
+async def _buscar(ctx, i):
+    return await ctx.cliente.get("/productos/search", params={"q": ctx.texto(2)})
+
+
+async def _stats(ctx, i):
+    return await ctx.cliente.get("/productos/stats")
+
+
+async def _obtener(ctx, i):
+    return await ctx.cliente.get(f"/productos/{ctx.id_existente()}")
+
+
+async def _crear(ctx, i):
+    r = await ctx.cliente.post("/productos/", json=ctx.producto())
+    if r.status_code == 200:
+        ctx.creados.append(r.json()["id"])
+    return r
+
+
+async def _reemplazar(ctx, i):
+    return await ctx.cliente.put(f"/productos/{ctx.id_existente()}", json=ctx.producto())
+
+
+async def _modificar(ctx, i):
+    return await ctx.cliente.patch(f"/productos/{ctx.id_existente()}", json={"cantidad": ctx.azar.randint(0, 200)})
+
+
+async def _eliminar(ctx, i):
+    return await ctx.cliente.delete(f"/productos/{ctx.creados.popleft()}")
+
+
+async def _ajustar(ctx, i):
+    # Pocos productos para que compitan por las mismas filas; reposición para no agotar el stock
+    return await ctx.cliente.post(f"/productos/{1 + i % 5}/ajuste", json={"delta": 1})
+
+
+async def _exportar(ctx, i):
+    return await ctx.cliente.get("/productos/export", params={"format": "csv" if i % 2 else "ndjson"})
+
+
+async def _crear_bulk(ctx, i):
+    r = await ctx.cliente.post("/productos/bulk", json=[ctx.producto() for _ in range(10)])
+    if r.status_code == 200:
+        ctx.creados_bulk.extend(item["id"] for item in r.json()["resultados"] if item["id"] is not None)
+    return r
+
+
+async def _modificar_bulk(ctx, i):
+    cambios = [{"id": ctx.id_existente(), "precio": round(ctx.azar.uniform(1, 1500), 2)} for _ in range(10)]
+    return await ctx.cliente.patch("/productos/bulk", json=cambios)
+
+
+async def _eliminar_bulk(ctx, i):
+    ids = [ctx.creados_bulk.popleft() for _ in range(min(10, len(ctx.creados_bulk)))]
+    return await ctx.cliente.request("DELETE", "/productos/bulk", json={"ids": ids})
+
+
+async def _importar(ctx, i):
+    lineas = ["nombre,descripcion,precio,cantidad"]
+    for _ in range(18):
+        p = ctx.producto()
+        lineas.append(f"{p['nombre']},{p['descripcion']},{p['precio']},{p['cantidad']}")
+    # Una comilla suelta en un campo sin comillas es texto; un campo entre comillas puede tener saltos
+    lineas += ['TV 55",grande,100,1', '"Mesa, roble","tabla\nmaciza",20,3']
+    r = await ctx.cliente.post("/productos/import", params={"format": "csv"},
+                               content="\n".join(lineas).encode("utf-8"))
+    if r.status_code == 200 and r.json()["insertados"] != 20:
+        raise AssertionError(f"Importación incompleta: {r.text}")  # Cuenta como error del escenario
+    return r
+
+
+async def _cambios(ctx, i):
+    return await ctx.cliente.get("/productos/changes", params={"since": ctx.desde})
+
+
+async def _eventos(ctx, i):
+    """Apertura del stream SSE hasta su primer bloque.
+
+    ASGITransport de httpx espera el cuerpo completo y un stream SSE no termina:
+    se llama a la app directamente y se simula la desconexión del cliente.
+    """
+    desconectado = asyncio.Event()
+    estado = {}
+
+    async def recibir():
+        await desconectado.wait()
+        return {"type": "http.disconnect"}
+
+    async def enviar(mensaje):
+        if mensaje["type"] == "http.response.start":
+            estado["status"] = mensaje["status"]
+        elif mensaje.get("body"):
+            desconectado.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/productos/events", "raw_path": b"/productos/events", "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    await ctx.app(scope, recibir, enviar)
+    return httpx.Response(estado.get("status", 500))
+
+
+async def _registro(ctx, i):
+    return await ctx.cliente.post("/usuarios/registro",
+                                  json={"nombre": "Nuevo", "email": ctx.email_nuevo(), "password": PASSWORD})
+
+
+async def _login(ctx, i):
+    return await ctx.cliente.post("/usuarios/login", json={"email": ctx.email, "password": PASSWORD})
+
+
+async def _me(ctx, i):
+    return await ctx.cliente.get("/usuarios/me", headers={"Authorization": f"Bearer {ctx.token}"})
+
+
+def _estado(nombre):
+    async def peticion(ctx, i):
+        return await ctx.cliente.get(f"/estado/{nombre}")
+    return Escenario(f"GET /estado/{nombre}", f"GET /estado/{nombre}", peticion)
+
+
+async def _metricas(ctx, i):
+    return await ctx.cliente.get("/metrics")
+
+
+# El orden importa: cada DELETE consume los ids que creó el POST correspondiente
+ESCENARIOS = [
+    Escenario("GET /", "GET /", _raiz),
+    Escenario("GET /productos/", "GET /productos/", _lista),
+    Escenario("GET /productos/ (filtros)", "GET /productos/", _lista_filtrada),
+    Escenario("GET /productos/ (cursor)", "GET /productos/", _lista_cursor),
+    Escenario("GET /productos/search", "GET /productos/search", _buscar),
+    Escenario("GET /productos/stats", "GET /productos/stats", _stats),
+    Escenario("GET /productos/{id}", "GET /productos/{id}", _obtener),
+    Escenario("POST /productos/", "POST /productos/", _crear),
+    Escenario("PUT /productos/{id}", "PUT /productos/{id}", _reemplazar),
+    Escenario("PATCH /productos/{id}", "PATCH /productos/{id}", _modificar),
+    Escenario("DELETE /productos/{id}", "DELETE /productos/{id}", _eliminar),
+    Escenario("GET /productos/export", "GET /productos/export", _exportar),
+    Escenario("POST /productos/{id}/ajuste", "POST /productos/{id}/ajuste", _ajustar),
+    Escenario("POST /productos/bulk", "POST /productos/bulk", _crear_bulk),
+    Escenario("PATCH /productos/bulk", "PATCH /productos/bulk", _modificar_bulk),
+    Escenario("DELETE /productos/bulk", "DELETE /productos/bulk", _eliminar_bulk),
+    Escenario("POST /productos/import", "POST /productos/import", _importar),
+    Escenario("GET /productos/changes", "GET /productos/changes", _cambios),
+    Escenario("GET /productos/events", "GET /productos/events", _eventos),
+    Escenario("POST /usuarios/registro", "POST /usuarios/registro", _registro),
+    Escenario("POST /usuarios/login", "POST /usuarios/login", _login),
+    Escenario("GET /usuarios/me", "GET /usuarios/me", _me),
+    _estado("pool"),
+    _estado("cache"),
+    _estado("hashing"),
+    _estado("resumen"),
+    _estado("cambios"),
+    _estado("ajustes"),
+    _estado("admision"),
+    Escenario("GET /metrics", "GET /metrics", _metricas),
+]
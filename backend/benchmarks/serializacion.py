@@ -0,0 +1,93 @@
+# benchmarks/serializacion.py
+"""CPU de serializar N filas de productos con cada camino de respuesta.
+
+Desde backend/:
+
+    python -m benchmarks.serializacion              # 10000 filas
+    python -m benchmarks.serializacion --filas 50000
+
+Caminos comparados (todos parten de las tuplas que entrega el cursor):
+
+- response_model: dict por fila (cursor dictionary=True), validación contra
+  ProductoResponse y json de la biblioteca estándar; lo que hacía FastAPI con
+  `return productos` y `response_model=list[ProductoResponse]`.
+- pydantic dump_json: dict por fila, validate_python + dump_json en Rust.
+- tuplas -> orjson: el camino actual de routers/productos.py (respuestas.filas_json).
+
+Además mide el costo y la reducción de tamaño de gzip/brotli sobre el JSON resultante.
+"""
+from datetime import datetime
+from decimal import Decimal
+import argparse
+import json
+import random
+import time
+from pydantic import TypeAdapter
+from schemas.producto_schemas import ProductoResponse
+import repositorio
+import respuestas
+
+COLUMNAS = repositorio.COLUMNAS_PRODUCTO
+
+
+def _filas(cantidad, semilla=1234):
+    azar = random.Random(semilla)
+    return [
+        (f"Producto {i}", "Descripción de prueba con algo de texto " * 2,
+         Decimal(f"{azar.uniform(1, 1500):.2f}"), azar.randint(0, 200), i + 1, 1)
+        for i in range(cantidad)
+    ]
+
+
+def _response_model(filas, adaptador=TypeAdapter(list[ProductoResponse])):
+    dicts = [dict(zip(COLUMNAS + ("created_at",), fila + (datetime(2024, 1, 1),))) for fila in filas]
+    datos = adaptador.dump_python(adaptador.validate_python(dicts), mode="json")
+    return json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _pydantic_dump_json(filas, adaptador=TypeAdapter(list[ProductoResponse])):
+    dicts = [dict(zip(COLUMNAS, fila)) for fila in filas]
+    return adaptador.dump_json(adaptador.validate_python(dicts))
+
+
+def _tuplas_orjson(filas):
+    return respuestas.filas_json(COLUMNAS, filas)
+
+
+def _cpu_ms(funcion, *args, repeticiones):
+    """Mejor tiempo de CPU (ms) de `repeticiones` ejecuciones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        resultado = funcion(*args)
+        mejor = min(mejor, time.process_time() - inicio)
+    return mejor * 1000, resultado
+
+
+def main():
+    p = argparse.ArgumentParser(description="CPU de serialización por cantidad de filas")
+    p.add_argument("--filas", type=int, default=10000)
+    p.add_argument("--repeticiones", type=int, default=7)
+    args = p.parse_args()
+
+    filas = _filas(args.filas)
+    print(f"{args.filas} filas (orjson {'sí' if respuestas.orjson else 'no'}, brotli {'sí' if respuestas.brotli else 'no'})")
+
+    referencia = None
+    for nombre, funcion in (("response_model + json", _response_model),
+                            ("pydantic dump_json", _pydantic_dump_json),
+                            ("tuplas -> orjson", _tuplas_orjson)):
+        ms, cuerpo = _cpu_ms(funcion, filas, repeticiones=args.repeticiones)
+        referencia = referencia or ms
+        print(f"  {nombre:<24} {ms:8.2f} ms CPU  {referencia / ms:5.1f}x  {len(cuerpo) / 1024:8.1f} KiB")
+
+    for codificacion in ("gzip", "br"):
+        if codificacion == "br" and respuestas.brotli is None:
+            continue
+        ms, comprimido = _cpu_ms(respuestas.comprimir, cuerpo, codificacion, repeticiones=args.repeticiones)
+        print(f"  + {codificacion:<22} {ms:8.2f} ms CPU  {len(comprimido) / 1024:14.1f} KiB "
+              f"({len(comprimido) / len(cuerpo):.0%} del original)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# benchmarks/sqlite_local.py
+"""Base de datos local para los benchmarks: SQLite detrás de la interfaz de mysql.connector.
+
+Reemplaza las conexiones que crea `database.PoolConexiones`, así que todo lo que pasa
+por `conexion()` (motor "sync") usa un archivo SQLite en lugar del
+contenedor de MySQL. El esquema replica docker/mysql-init/init.sql, incluidos los
+triggers del resumen de inventario; las funciones propias de MySQL que usan los
+routers (LAST_INSERT_ID(expr), MOD, NOW(6), rango_precio) se registran como funciones
+Python y ON UPDATE CURRENT_TIMESTAMP(6) se emula con un trigger.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import database
+import resumen
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S.%f"  # Como TIMESTAMP(6): se compara bien como texto
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda fecha: fecha.strftime(FORMATO_FECHA))
+
+# Mismo delta que el procedimiento resumen_sumar de init.sql
+_SUMAR = """
+    INSERT INTO productos_resumen (slot, rango, productos, unidades, valor, bajo_stock, sin_stock)
+    VALUES ({f}.id % 16, rango_precio({f}.precio), {s}1, {s}{f}.cantidad, {s}{f}.precio * {f}.cantidad,
+            {s}({f}.cantidad <= {bajo}), {s}({f}.cantidad <= 0))
+    ON CONFLICT (slot, rango) DO UPDATE SET
+        productos = productos + excluded.productos, unidades = unidades + excluded.unidades,
+        valor = valor + excluded.valor, bajo_stock = bajo_stock + excluded.bajo_stock,
+        sin_stock = sin_stock + excluded.sin_stock;
+"""
+
+ESQUEMA = f"""
+CREATE TABLE usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    rol TEXT DEFAULT 'usuario',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE productos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    descripcion TEXT,
+    precio NUMERIC NOT NULL DEFAULT 0,
+    cantidad INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT (NOW(6)),
+    deleted_at TEXT
+);
+CREATE INDEX idx_productos_cambios ON productos (updated_at, id);
+CREATE INDEX idx_productos_eliminados ON productos (deleted_at);
+CREATE INDEX idx_productos_precio ON productos (precio, id);
+CREATE INDEX idx_productos_cantidad ON productos (cantidad, id);
+CREATE INDEX idx_productos_nombre ON productos (nombre, id);
+CREATE TABLE productos_resumen (
+    slot INTEGER NOT NULL,
+    rango INTEGER NOT NULL,
+    productos INTEGER NOT NULL DEFAULT 0,
+    unidades INTEGER NOT NULL DEFAULT 0,
+    valor NUMERIC NOT NULL DEFAULT 0,
+    bajo_stock INTEGER NOT NULL DEFAULT 0,
+    sin_stock INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (slot, rango)
+);
+CREATE TRIGGER productos_resumen_insert AFTER INSERT ON productos BEGIN
+    {_SUMAR.format(f="NEW", s="", bajo=resumen.STOCK_BAJO)}
+END;
+CREATE TRIGGER productos_resumen_update AFTER UPDATE ON productos
+WHEN NEW.deleted_at IS NULL AND OLD.deleted_at IS NULL
+     AND (NEW.precio <> OLD.precio OR NEW.cantidad <> OLD.cantidad) BEGIN
+    {_SUMAR.format(f="OLD", s="-", bajo=resumen.STOCK_BAJO)}
+    {_SUMAR.format(f="NEW", s="", bajo=resumen.STOCK_BAJO)}
+END;
+CREATE TRIGGER productos_resumen_eliminar AFTER UPDATE ON productos
+WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL BEGIN
+    {_SUMAR.format(f="OLD", s="-", bajo=resumen.STOCK_BAJO)}
+END;
+CREATE TRIGGER productos_resumen_restaurar AFTER UPDATE ON productos
+WHEN OLD.deleted_at IS NOT NULL AND NEW.deleted_at IS NULL BEGIN
+    {_SUMAR.format(f="NEW", s="", bajo=resumen.STOCK_BAJO)}
+END;
+CREATE TRIGGER productos_resumen_delete AFTER DELETE ON productos WHEN OLD.deleted_at IS NULL BEGIN
+    {_SUMAR.format(f="OLD", s="-", bajo=resumen.STOCK_BAJO)}
+END;
+-- ON UPDATE CURRENT_TIMESTAMP(6) de init.sql
+CREATE TRIGGER productos_updated_at AFTER UPDATE ON productos WHEN NEW.updated_at = OLD.updated_at BEGIN
+    UPDATE productos SET updated_at = NOW(6) WHERE id = NEW.id;
+END;
+"""
+
+_INSERT_VALUES = re.compile(r"(?is)^(\s*INSERT\s+INTO\s.+?\bVALUES\s*)(\(.*\))\s*$")
+_FOR_UPDATE = re.compile(r"(?i)\s+FOR\s+UPDATE\b")
+_ESCRITURA = re.compile(r"(?i)^\s*(INSERT|UPDATE|DELETE|REPLACE)\b")
+
+# Un escritor a la vez por archivo. Sin esto, los escritores concurrentes esperan en el
+# busy handler de SQLite (reintentos de hasta 100 ms) y el benchmark mide ese backoff
+# en lugar de la API; MySQL bloquea por fila y no tiene ese comportamiento.
+_escritores = {}
+_escritores_lock = threading.Lock()
+
+
+def _lock_escritura(ruta):
+    with _escritores_lock:
+        return _escritores.setdefault(ruta, threading.Lock())
+
+
+def rango_precio(precio):
+    """Igual que la función rango_precio de init.sql."""
+    for rango, (_, hasta) in enumerate(resumen.RANGOS_PRECIO):
+        if hasta is None or precio < hasta:
+            return rango
+
+
+def traducir(sql):
+    """Dialecto MySQL de los routers -> SQLite."""
+    return _FOR_UPDATE.sub("", sql).replace("%s", "?")
+
+
+def conectar(ruta):
+    """Conexión sqlite3 con las funciones de MySQL que usan el esquema y la reconciliación."""
+    conn = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+    conn.create_function("MOD", 2, lambda a, b: a % b, deterministic=True)
+    conn.create_function("NOW", 1, lambda precision: datetime.now().strftime(FORMATO_FECHA))
+    conn.create_function("rango_precio", 1, rango_precio, deterministic=True)
+    return conn
+
+
+class CursorSQLite:
+    """Lo que usan los routers de un cursor de mysql.connector."""
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self._cursor = conexion._sqlite.cursor()
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        self._conexion._last_insert_id = None
+        with self._conexion._escritura(sql):
+            self._cursor.execute(traducir(sql), tuple(params))
+        self.rowcount = self._cursor.rowcount
+        # UPDATE ... SET version = LAST_INSERT_ID(version + 1) devuelve la versión aquí
+        if self._conexion._last_insert_id is not None:
+            self.lastrowid = self._conexion._last_insert_id
+        else:
+            self.lastrowid = self._cursor.lastrowid
+
+    def executemany(self, sql, seq_params):
+        filas = [tuple(p) for p in seq_params]
+        insert = _INSERT_VALUES.match(sql)
+        if insert and filas:
+            # Como mysql.connector: un solo INSERT de varias filas; lastrowid es el primer id
+            sql = insert.group(1) + ", ".join([insert.group(2)] * len(filas))
+            with self._conexion._escritura(sql):
+                self._cursor.execute(traducir(sql), [valor for fila in filas for valor in fila])
+            self.rowcount = self._cursor.rowcount
+            self.lastrowid = self._cursor.lastrowid - len(filas) + 1
+            return
+        with self._conexion._escritura(sql):
+            self._cursor.executemany(traducir(sql), filas)
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(columna[0] for columna in self._cursor.description or ())
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionSQLite:
+    """Lo que usan `PoolConexiones` y los routers de una conexión de mysql.connector."""
+
+    def __init__(self, ruta):
+        self._sqlite = conectar(ruta)
+        self._last_insert_id = None
+        self._sqlite.create_function("LAST_INSERT_ID", 1, self._guardar_id, deterministic=False)
+        self._lock = _lock_escritura(ruta)
+        self._escribiendo = False
+
+    @contextmanager
+    def _escritura(self, sql):
+        """Toma el lock de escritura en la primera escritura de la transacción."""
+        if not self._escribiendo and _ESCRITURA.match(sql):
+            self._lock.acquire()
+            self._escribiendo = True
+        try:
+            yield
+        finally:
+            if not self._sqlite.in_transaction:
+                self._liberar()
+
+    def _liberar(self):
+        if self._escribiendo:
+            self._escribiendo = False
+            self._lock.release()
+
+    def _guardar_id(self, valor):
+        self._last_insert_id = valor
+        return valor
+
+    def cursor(self, buffered=False, **kwargs):
+        return CursorSQLite(self)
+
+    def start_transaction(self):
+        self._sqlite.execute("BEGIN")
+
+    def commit(self):
+        try:
+            self._sqlite.commit()
+        finally:
+            self._liberar()
+
+    def rollback(self):
+        try:
+            self._sqlite.rollback()
+        finally:
+            self._liberar()
+
+    @property
+    def in_transaction(self):
+        return self._sqlite.in_transaction
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        try:
+            self._sqlite.close()
+        finally:
+            self._liberar()
+
+
+def crear_base(directorio=None):
+    """Crea un archivo SQLite vacío con el esquema y devuelve su ruta."""
+    ruta = os.path.join(directorio or tempfile.mkdtemp(prefix="bench_"), "productos.sqlite")
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    conn = conectar(ruta)
+    conn.execute("PRAGMA journal_mode=WAL")  # Lectores concurrentes con un escritor
+    conn.executescript(ESQUEMA)
+    conn.close()
+    return ruta
+
+
+def instalar(ruta):
+    """Hace que el pool síncrono de `database` abra conexiones a `ruta`."""
+    database.DB_ENGINE = "sync"
+    database.PoolConexiones._crear = lambda pool: ConexionSQLite(ruta)
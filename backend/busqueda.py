@@ -0,0 +1,148 @@
+# busqueda.py
+from collections import defaultdict
+from datetime import datetime
+from dotenv import load_dotenv
+import asyncio
+import heapq
+import math
+import re
+import unicodedata
+import os
+import cache
+import cambios
+import repositorio
+
+load_dotenv()
+
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "fulltext")                 # fulltext | memoria
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))       # Top-k: límite de offset + limit
+
+TOKEN_MINIMO = 3      # Igual que innodb_ft_min_token_size
+PESO_NOMBRE = 2.0     # Una coincidencia en el nombre vale más que en la descripción
+
+
+def tokenizar(texto):
+    """Minúsculas y sin acentos, como la collation de MySQL."""
+    if not texto:
+        return []
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in re.findall(r"\w+", texto) if len(t) >= TOKEN_MINIMO]
+
+
+class IndiceInvertido:
+    """Índice término -> {id: peso} en memoria, para bases sin FULLTEXT (SQLite local).
+
+    Una búsqueda solo recorre las listas de los términos consultados, no el catálogo.
+    Guarda también los términos de cada producto para poder reemplazarlo o quitarlo
+    sin reconstruir el resto.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._terminos = {}   # id -> términos con los que está indexado
+
+    def construir(self, filas):
+        self._postings = defaultdict(dict)
+        self._terminos = {}
+        for fila in filas:
+            self.agregar(fila.id, fila.nombre, fila.descripcion)
+
+    def agregar(self, id, nombre, descripcion):
+        """Indexa el producto, reemplazando lo que hubiera para el mismo id."""
+        self.quitar(id)
+        pesos = defaultdict(float)
+        for termino in tokenizar(nombre):
+            pesos[termino] += PESO_NOMBRE
+        for termino in tokenizar(descripcion):
+            pesos[termino] += 1.0
+        for termino, peso in pesos.items():
+            self._postings[termino][id] = peso
+        self._terminos[id] = tuple(pesos)
+
+    def quitar(self, id):
+        for termino in self._terminos.pop(id, ()):
+            postings = self._postings[termino]
+            del postings[id]
+            if not postings:
+                del self._postings[termino]
+
+    def buscar(self, texto, k):
+        """Los k ids con mayor puntaje tf-idf, como lista de (puntaje, id)."""
+        puntajes = defaultdict(float)
+        for termino in set(tokenizar(texto)):
+            postings = self._postings.get(termino)
+            if not postings:
+                continue
+            idf = math.log(1 + len(self._terminos) / len(postings))
+            for id, peso in postings.items():
+                puntajes[id] += peso * idf
+        return heapq.nlargest(k, ((p, -id) for id, p in puntajes.items()))
+
+
+_indice = IndiceInvertido()
+_indice_cambios = None   # Valor de cache.cambios() con el que se actualizó
+_indice_posicion = None  # Posición del feed de cambios hasta la que el índice está completo
+_indice_lock = asyncio.Lock()
+
+
+async def _actualizar(db):
+    """Aplica al índice las filas escritas desde _indice_posicion.
+
+    Se lee hasta lo último visible, pero la posición solo avanza hasta cambios.limite():
+    una transacción que confirma tarde vuelve a leerse la próxima vez. Aplicar una fila
+    dos veces deja el índice igual.
+    """
+    global _indice_posicion
+    hasta = await cambios.limite(db)
+    if cambios.expirado(_indice_posicion, hasta):
+        # Las lápidas ya se purgaron: no se sabría qué productos quitar
+        _indice.construir(await repositorio.textos_productos(db))
+    else:
+        desde, hay_mas = _indice_posicion, True
+        while hay_mas:
+            lote, hay_mas = await cambios.leer(db, desde, datetime.max, cambios.LOTE)
+            for cambio in lote:
+                if cambio.tipo == "delete":
+                    _indice.quitar(cambio.datos["id"])
+                else:
+                    _indice.agregar(cambio.datos["id"], cambio.datos["nombre"], cambio.datos["descripcion"])
+            if lote:
+                desde = lote[-1].posicion
+    _indice_posicion = max(_indice_posicion, (hasta, 0))
+
+
+async def _indice_vigente(db):
+    """Construye el índice la primera vez; después solo aplica las filas que cambiaron."""
+    global _indice_cambios, _indice_posicion
+    async with _indice_lock:
+        if _indice_cambios != cache.cambios():
+            valor = cache.cambios()
+            if _indice_posicion is None:
+                # La posición se toma antes de leer: lo escrito durante la lectura se aplica después
+                posicion = (await cambios.limite(db), 0)
+                _indice.construir(await repositorio.textos_productos(db))
+                _indice_posicion = posicion
+            else:
+                await _actualizar(db)
+            _indice_cambios = valor
+    return _indice
+
+
+async def _buscar_memoria(db, texto, limit, offset):
+    indice = await _indice_vigente(db)
+    mejores = indice.buscar(texto, offset + limit)[offset:]
+    if not mejores:
+        return []
+    puntajes = {-id_negado: puntaje for puntaje, id_negado in mejores}
+    filas = [repositorio.ProductoRelevancia(*producto, puntajes[producto.id])
+             for producto in await repositorio.productos_por_ids(db, puntajes)]
+    filas.sort(key=lambda fila: (-fila.relevancia, fila.id))
+    return filas
+
+
+async def buscar(db, texto, limit, offset=0):
+    """ProductoRelevancia que coinciden con `texto`, de mayor a menor relevancia."""
+    if SEARCH_ENGINE == "memoria":
+        return await _buscar_memoria(db, texto, limit, offset)
+    return await repositorio.buscar_fulltext(db, texto, limit, offset)
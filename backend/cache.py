@@ -0,0 +1,246 @@
+# cache.py
+from collections import OrderedDict, namedtuple
+from dotenv import load_dotenv
+import hashlib
+import json
+import threading
+import time
+import os
+
+load_dotenv()
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")   # memoria | redis
+CACHE_MAX_ITEMS = int(os.getenv("CACHE_MAX_ITEMS", "1000"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))          # Segundos
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Respuesta ya serializada: el cuerpo JSON, sus cabeceras (incluye ETag) y el cuerpo
+# comprimido por codificación ({"br": ..., "gzip": ...}), que se completa al servirla
+Entrada = namedtuple("Entrada", ["cuerpo", "cabeceras", "comprimidos"])
+
+
+def calcular_etag(cuerpo: bytes) -> str:
+    return '"' + hashlib.blake2b(cuerpo, digest_size=16).hexdigest() + '"'
+
+
+def etag_coincide(if_none_match, etag) -> bool:
+    """Compara la cabecera If-None-Match con un ETag fuerte."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(valor.strip().removeprefix("W/") == etag for valor in if_none_match.split(","))
+
+
+class _Contadores:
+    def __init__(self):
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    def como_dict(self):
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "expulsiones": self.expulsiones,
+            "invalidaciones": self.invalidaciones,
+        }
+
+
+class CacheMemoria:
+    """Cache LRU en el proceso con expiración por TTL."""
+
+    def __init__(self, max_items=CACHE_MAX_ITEMS, ttl=CACHE_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos = OrderedDict()  # clave -> (expira, Entrada)
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self._contadores = _Contadores()
+
+    async def obtener(self, clave):
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None:
+                self._contadores.fallos += 1
+                return None
+            expira, entrada = item
+            if expira < time.monotonic():
+                del self._datos[clave]
+                self._contadores.fallos += 1
+                self._contadores.expulsiones += 1
+                return None
+            self._datos.move_to_end(clave)
+            self._contadores.aciertos += 1
+            return entrada
+
+    async def guardar(self, clave, entrada):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, entrada)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+                self._contadores.expulsiones += 1
+
+    async def actualizar(self, clave, entrada):
+        """La entrada ganó una variante comprimida: en memoria ya es el mismo objeto."""
+
+    async def borrar(self, clave):
+        with self._lock:
+            if self._datos.pop(clave, None) is not None:
+                self._contadores.invalidaciones += 1
+
+    async def generacion(self):
+        return self._generacion
+
+    async def nueva_generacion(self):
+        # Las claves incluyen la generación: al cambiarla todo lo anterior queda obsoleto
+        with self._lock:
+            self._generacion += 1
+            self._contadores.invalidaciones += len(self._datos)
+            self._datos.clear()
+
+    async def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {"backend": "memoria", "activo": True, "items": len(self._datos),
+                    "max_items": self.max_items, "ttl": self.ttl, **self._contadores.como_dict()}
+
+
+class CacheRedis:
+    """Misma interfaz que CacheMemoria, compartida entre workers vía Redis.
+
+    Usa el cliente asíncrono de redis-py: esperar a Redis no bloquea el event loop.
+    La expulsión LRU la hace el propio Redis (maxmemory-policy allkeys-lru).
+    """
+
+    PREFIJO = "productos:"
+
+    def __init__(self, url=REDIS_URL, ttl=CACHE_TTL):
+        import redis.asyncio  # Dependencia opcional, solo con CACHE_BACKEND=redis
+
+        self.ttl = ttl
+        self._redis = redis.asyncio.Redis.from_url(url)
+        self._contadores = _Contadores()
+
+    async def obtener(self, clave):
+        valor = await self._redis.get(self.PREFIJO + clave)
+        if valor is None:
+            self._contadores.fallos += 1
+            return None
+        self._contadores.aciertos += 1
+        # [cabeceras, {codificación: bytes}] \n cuerpo + variantes comprimidas, en ese orden
+        encabezado, datos = valor.split(b"\n", 1)
+        cabeceras, longitudes = json.loads(encabezado)
+        inicio = len(datos) - sum(longitudes.values())
+        cuerpo, comprimidos = datos[:inicio], {}
+        for codificacion, longitud in longitudes.items():
+            comprimidos[codificacion] = datos[inicio:inicio + longitud]
+            inicio += longitud
+        return Entrada(cuerpo, cabeceras, comprimidos)
+
+    def _serializar(self, entrada):
+        longitudes = {codificacion: len(cuerpo) for codificacion, cuerpo in entrada.comprimidos.items()}
+        return (json.dumps([entrada.cabeceras, longitudes]).encode("utf-8") + b"\n"
+                + entrada.cuerpo + b"".join(entrada.comprimidos.values()))
+
+    async def guardar(self, clave, entrada):
+        await self._redis.set(self.PREFIJO + clave, self._serializar(entrada), ex=max(1, int(self.ttl)))
+
+    async def actualizar(self, clave, entrada):
+        """Vuelve a guardar la entrada con sus variantes comprimidas, sin renovar el TTL."""
+        await self._redis.set(self.PREFIJO + clave, self._serializar(entrada), keepttl=True)
+
+    async def borrar(self, clave):
+        if await self._redis.delete(self.PREFIJO + clave):
+            self._contadores.invalidaciones += 1
+
+    async def generacion(self):
+        return int(await self._redis.get(self.PREFIJO + "generacion") or 0)
+
+    async def nueva_generacion(self):
+        await self._redis.incr(self.PREFIJO + "generacion")
+        self._contadores.invalidaciones += 1
+
+    async def limpiar(self):
+        await self.nueva_generacion()
+
+    def estadisticas(self):
+        return {"backend": "redis", "activo": True, "ttl": self.ttl, **self._contadores.como_dict()}
+
+
+class CacheDesactivada:
+    """Sustituto cuando CACHE_ENABLED=false: nunca guarda nada."""
+
+    async def obtener(self, clave):
+        return None
+
+    async def guardar(self, clave, entrada):
+        pass
+
+    async def actualizar(self, clave, entrada):
+        pass
+
+    async def borrar(self, clave):
+        pass
+
+    async def generacion(self):
+        return 0
+
+    async def nueva_generacion(self):
+        pass
+
+    async def limpiar(self):
+        pass
+
+    def estadisticas(self):
+        return {"backend": None, "activo": False}
+
+
+def _crear_cache():
+    if not CACHE_ENABLED:
+        return CacheDesactivada()
+    if CACHE_BACKEND == "redis":
+        return CacheRedis()
+    return CacheMemoria()
+
+
+cache = _crear_cache()
+
+
+# --- Claves e invalidación del catálogo ---
+# Todas las claves llevan la generación leída ANTES de consultar la base de datos:
+# si una escritura ocurre mientras tanto, lo leído se guarda bajo una generación
+# vieja y nunca se sirve.
+async def clave_producto(id):
+    return f"producto:{await cache.generacion()}:{id}"
+
+
+async def clave_lista(params):
+    consulta = "&".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None)
+    return f"lista:{await cache.generacion()}:{consulta}"
+
+
+async def clave_busqueda(params):
+    consulta = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    return f"busqueda:{await cache.generacion()}:{consulta}"
+
+
+_cambios = 0
+
+
+def cambios():
+    """Escrituras hechas desde este proceso, aunque el cache esté desactivado."""
+    return _cambios
+
+
+async def invalidar():
+    """Se llama tras cualquier escritura en productos."""
+    global _cambios
+    _cambios += 1
+    await cache.nueva_generacion()
@@ -0,0 +1,262 @@
+# cambios.py
+from collections import namedtuple
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import asyncio
+import base64
+import json
+import time
+import os
+from database import conexion
+import repositorio
+import respuestas
+
+load_dotenv()
+
+CHANGES_MARGIN_MS = float(os.getenv("CHANGES_MARGIN_MS", "500"))          # Antigüedad mínima de un cambio entregado
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL", "1"))    # Segundos entre lecturas para el SSE
+CHANGES_RETENTION_DAYS = float(os.getenv("CHANGES_RETENTION_DAYS", "7"))  # Días con lápidas; 0 = no purgar
+# Frenar el feed ante transacciones de escritura abiertas (lee innodb_trx, requiere PROCESS)
+CHANGES_TRACK_TRANSACTIONS = os.getenv("CHANGES_TRACK_TRANSACTIONS", "true").lower() in ("1", "true", "si", "yes")
+CHANGES_QUEUE_MAX = int(os.getenv("CHANGES_QUEUE_MAX", "1000"))           # Eventos pendientes por cliente SSE
+CHANGES_KEEPALIVE = 15                                                    # Segundos entre comentarios "ping" del SSE
+PURGA_INTERVALO = 3600                                                    # Segundos entre purgas de lápidas
+LOTE = 500
+
+# Posición = (updated_at, id); updated_at lo mantiene MySQL (ON UPDATE CURRENT_TIMESTAMP(6))
+
+# tipo: create | update | delete; datos: el producto (o id y versión si se eliminó)
+Cambio = namedtuple("Cambio", ["tipo", "datos", "posicion"])
+
+
+# --- Tokens ---
+def codificar(posicion):
+    fecha, id = posicion
+    datos = json.dumps([fecha.isoformat(sep=" "), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar(token):
+    try:
+        relleno = "=" * (-len(token) % 4)
+        fecha, id = json.loads(base64.urlsafe_b64decode(token + relleno))
+        fecha = datetime.fromisoformat(fecha)
+    except (ValueError, TypeError):
+        raise ValueError("Token inválido")
+    if not isinstance(id, int):
+        raise ValueError("Token inválido")
+    return fecha, id
+
+
+def _fecha(valor):
+    # El conector de MySQL devuelve datetime; la base SQLite de los benchmarks, texto
+    return valor if isinstance(valor, datetime) else datetime.fromisoformat(valor)
+
+
+# --- Lectura ---
+async def limite(db):
+    """Hasta dónde se consideran asentados los cambios, con el reloj de la base de datos.
+
+    updated_at se fija al ejecutar la sentencia y no al confirmarla: una transacción
+    abierta puede confirmar más tarde filas con un updated_at anterior a otras ya
+    entregadas, y el cliente se las saltaría. Por eso el límite queda antes del
+    comienzo de la transacción de escritura más antigua en curso: una importación,
+    un lote agrupado o una espera de lock demoran el feed, pero no le hacen perder
+    filas. CHANGES_MARGIN_MS cubre el instante en que una sentencia ya fijó su
+    NOW() y todavía no figura en innodb_trx.
+
+    Con CHANGES_TRACK_TRANSACTIONS=false (sin privilegio PROCESS) solo se aplica el
+    margen, y entonces ninguna transacción de escritura puede durar más que él.
+    """
+    margen = timedelta(milliseconds=CHANGES_MARGIN_MS)
+    if not CHANGES_TRACK_TRANSACTIONS:
+        return _fecha(await repositorio.ahora(db)) - margen
+    ahora, inicio = await repositorio.ahora_y_transacciones(db)
+    hasta = _fecha(ahora) - margen
+    if inicio is not None:
+        # trx_started tiene precisión de segundos: se resta uno por el redondeo
+        hasta = min(hasta, _fecha(inicio) - timedelta(seconds=1))
+    return hasta
+
+
+def expirado(desde, hasta):
+    """El token es anterior a las lápidas purgadas: ya no se puede saber qué se eliminó."""
+    return CHANGES_RETENTION_DAYS > 0 and desde[0] < hasta - timedelta(days=CHANGES_RETENTION_DAYS)
+
+
+async def leer(db, desde, hasta, limit):
+    """Cambios posteriores a la posición `desde` y hasta `hasta`, en orden: (cambios, hay_mas)."""
+    filas = await repositorio.cambios_productos(db, desde, hasta, limit + 1)
+    resultado = []
+    for fila in filas[:limit]:
+        posicion = (_fecha(fila.updated_at), fila.id)
+        if fila.deleted_at is not None:
+            resultado.append(Cambio("delete", {"id": fila.id, "version": fila.version}, posicion))
+        else:
+            # Una fila que nunca se actualizó sigue en la versión 1
+            producto = dict(zip(repositorio.COLUMNAS_PRODUCTO, fila))
+            resultado.append(Cambio("create" if fila.version == 1 else "update", producto, posicion))
+    return resultado, len(filas) > limit
+
+
+def evento_sse(cambio):
+    datos = respuestas.dumps(cambio.datos).decode("utf-8")
+    return f"id: {codificar(cambio.posicion)}\nevent: {cambio.tipo}\ndata: {datos}\n\n"
+
+
+# --- Difusión a los clientes SSE ---
+class Difusor:
+    """Un único lector por proceso que reparte los cambios a todos los clientes conectados.
+
+    Las rutas de escritura llaman a avisar() para no esperar al siguiente intervalo;
+    las escrituras de otros workers llegan con la lectura periódica.
+    """
+
+    def __init__(self):
+        self._colas = set()
+        self._aviso = None
+        self._tarea = None
+        self.posicion = None
+        self.enviados = 0
+        self.cortados = 0
+        self.errores = 0
+
+    def suscribir(self):
+        cola = asyncio.Queue(CHANGES_QUEUE_MAX)
+        self._colas.add(cola)
+        if self._tarea is None or self._tarea.done():
+            self._aviso = asyncio.Event()
+            self._tarea = asyncio.create_task(self._leer_siempre())
+        return cola
+
+    def cancelar(self, cola):
+        self._colas.discard(cola)
+
+    def avisar(self):
+        if self._aviso is not None:
+            self._aviso.set()
+
+    def _repartir(self, cambio):
+        for cola in list(self._colas):
+            try:
+                cola.put_nowait(cambio)
+                self.enviados += 1
+            except asyncio.QueueFull:
+                # Cliente demasiado lento: se le corta el stream y, al reconectar,
+                # retoma desde su Last-Event-ID leyendo de la base de datos
+                self._colas.discard(cola)
+                cola.get_nowait()
+                cola.put_nowait(None)
+                self.cortados += 1
+
+    async def _leer_siempre(self):
+        # Termina sola cuando se desconecta el último cliente
+        while self._colas:
+            try:
+                async with conexion() as db:
+                    hasta = await limite(db)
+                    if self.posicion is None:
+                        self.posicion = (hasta, 0)
+                    hay_mas = True
+                    while hay_mas:
+                        lote, hay_mas = await leer(db, self.posicion, hasta, LOTE)
+                        for cambio in lote:
+                            self._repartir(cambio)
+                        if lote:
+                            self.posicion = lote[-1].posicion
+            except Exception as e:
+                self.errores += 1
+                print(f"Error al leer cambios de productos: {e}")
+            try:
+                await asyncio.wait_for(self._aviso.wait(), CHANGES_POLL_INTERVAL)
+                self._aviso.clear()
+                await asyncio.sleep(CHANGES_MARGIN_MS / 1000)  # Que la escritura avisada quede asentada
+            except asyncio.TimeoutError:
+                pass
+        self.posicion = None
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    def estadisticas(self):
+        return {
+            "clientes": len(self._colas),
+            "posicion": codificar(self.posicion) if self.posicion else None,
+            "eventos_enviados": self.enviados,
+            "clientes_cortados": self.cortados,
+            "errores": self.errores,
+        }
+
+
+difusor = Difusor()
+
+
+def avisar():
+    """Se llama tras cualquier escritura en productos."""
+    difusor.avisar()
+
+
+# --- Purga periódica de lápidas ---
+_tarea = None
+_ultima_purga = None
+_purgados = 0
+
+
+async def purgar():
+    """Borra de verdad los productos eliminados hace más de CHANGES_RETENTION_DAYS."""
+    global _ultima_purga, _purgados
+    async with conexion() as db:
+        try:
+            hasta = await limite(db) - timedelta(days=CHANGES_RETENTION_DAYS)
+            purgados = await repositorio.purgar_eliminados(db, hasta)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    _ultima_purga = time.time()
+    _purgados += purgados
+    return purgados
+
+
+async def _purgar_siempre():
+    while True:
+        try:
+            purgados = await purgar()
+            if purgados:
+                print(f"Lápidas de productos purgadas: {purgados}")
+        except Exception as e:
+            print(f"Error al purgar productos eliminados: {e}")
+        await asyncio.sleep(PURGA_INTERVALO)
+
+
+def iniciar():
+    global _tarea
+    if _tarea is None and CHANGES_RETENTION_DAYS > 0:
+        _tarea = asyncio.create_task(_purgar_siempre())
+
+
+async def cerrar():
+    global _tarea
+    await difusor.detener()
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
+
+
+def estadisticas():
+    return {
+        "retencion_dias": CHANGES_RETENTION_DAYS,
+        "ultima_purga": _ultima_purga,
+        "lapidas_purgadas": _purgados,
+        **difusor.estadisticas(),
+    }
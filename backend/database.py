@@ -1,21 +1,634 @@
 # database.py
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.constants import ClientFlag
+from pymysql.constants import CLIENT
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+from collections import OrderedDict, deque, namedtuple
+import aiomysql
+import anyio
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
 import os
+import metricas
 
 load_dotenv()  # Carga variables del .env
 
-def get_connection():
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "mysql_db"),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD", "root_password"),
-            database=os.getenv("DB_NAME", "my_database")
+# Motor de acceso a datos: "async" (aiomysql, sin hilos) o "sync" (mysql.connector en el threadpool)
+DB_ENGINE = os.getenv("DB_ENGINE", "async")
+
+# Configuración del pool (variables de entorno)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))                     # Máximo de conexiones abiertas
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))              # Segundos máximos esperando una conexión libre
+POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "5"))  # Inactividad tras la cual se verifica la conexión
+
+# Sentencias preparadas en el servidor (solo motor sync: aiomysql no implementa COM_STMT_PREPARE)
+DB_PREPARED = os.getenv("DB_PREPARED", "true").lower() in ("1", "true", "si", "yes")
+DB_PREPARED_CACHE = int(os.getenv("DB_PREPARED_CACHE", "64"))  # Sentencias preparadas por conexión (LRU)
+LOTE_RECORRIDO = 1000  # Filas por lectura de db.recorrer()
+
+# Instante (time.monotonic) hasta el que la petición en curso puede esperar una conexión;
+# lo fija el control de admisión para que la espera en el pool no pase del plazo de la clase
+plazo_conexion = contextvars.ContextVar("plazo_conexion", default=None)
+
+
+class ErrorConexion(Exception):
+    """No se pudo obtener una conexión del pool (MySQL caído o pool agotado)."""
+
+
+def _config_mysql():
+    return dict(
+        host=os.getenv("DB_HOST", "mysql_db"),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", "root_password"),
+        database=os.getenv("DB_NAME", "my_database"),
+        # rowcount de un UPDATE = filas encontradas, aunque no cambien (existencia sin SELECT)
+        client_flags=[ClientFlag.FOUND_ROWS],
+        # Las lecturas no dejan transacciones abiertas; las escrituras abren la suya (ver _iniciar)
+        autocommit=True,
+    )
+
+
+class PoolConexiones:
+    """Pool de conexiones MySQL reutilizables.
+
+    Las conexiones se crean bajo demanda hasta `tamano` y se devuelven al pool
+    al terminar cada petición, evitando el handshake TCP + autenticación por
+    request. Si no hay conexiones libres se espera como máximo `timeout`
+    segundos antes de fallar con `ErrorConexion`.
+    """
+
+    def __init__(self, tamano=POOL_SIZE, timeout=POOL_TIMEOUT, ping_interval=POOL_PING_INTERVAL, **config):
+        self.tamano = tamano
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.config = config or _config_mysql()
+        self._libres = deque()  # (conexión, último uso)
+        self._abiertas = 0
+        self._cerrado = False
+        self._cond = threading.Condition()
+        # Estadísticas
+        self._esperando = 0
+        self._checkouts = 0
+        self._fallos_checkout = 0
+        self._creadas = 0
+        self._descartadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    def _crear(self):
+        return mysql.connector.connect(**self.config)
+
+    def _sana(self, conn, ultimo_uso):
+        # Solo se hace ping si la conexión estuvo inactiva un tiempo
+        if time.monotonic() - ultimo_uso < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def obtener(self, timeout=None):
+        inicio = time.monotonic()
+        limite = inicio + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            self._esperando += 1
+            try:
+                while True:
+                    if self._cerrado:
+                        self._fallos_checkout += 1
+                        raise ErrorConexion("El pool de conexiones está cerrado")
+                    if self._libres:
+                        conn, ultimo_uso = self._libres.pop()
+                        break
+                    if self._abiertas < self.tamano:
+                        self._abiertas += 1
+                        conn, ultimo_uso = None, None
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._fallos_checkout += 1
+                        raise ErrorConexion("Tiempo de espera agotado para obtener una conexión")
+                    self._cond.wait(restante)
+            finally:
+                self._esperando -= 1
+
+        # La creación y el ping se hacen fuera del lock
+        if conn is not None and not self._sana(conn, ultimo_uso):
+            self._descartar(conn, reservar=True)
+            conn = None
+        if conn is None:
+            try:
+                conn = self._crear()
+            except Error as e:
+                with self._cond:
+                    self._abiertas -= 1
+                    self._fallos_checkout += 1
+                    self._cond.notify()
+                print("Error al conectar a MySQL:", e)
+                raise ErrorConexion(str(e)) from e
+            with self._cond:
+                self._creadas += 1
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self._checkouts += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        if not descartar:
+            try:
+                # Solo queda una transacción abierta si una escritura no llegó a commit()
+                if conn.in_transaction:
+                    conn.rollback()
+            except Error:
+                descartar = True
+        if descartar or self._cerrado:
+            self._descartar(conn)
+            return
+        with self._cond:
+            self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _descartar(self, conn, reservar=False):
+        try:
+            conn.close()
+        except Error:
+            pass
+        with self._cond:
+            self._descartadas += 1
+            if not reservar:
+                # Libera el cupo; si `reservar` el llamador reutiliza el cupo
+                self._abiertas -= 1
+                self._cond.notify()
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            libres = list(self._libres)
+            self._libres.clear()
+            self._cond.notify_all()
+        for conn, _ in libres:
+            self._descartar(conn)
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                "tamano": self.tamano,
+                "abiertas": self._abiertas,
+                "en_uso": self._abiertas - len(self._libres),
+                "inactivas": len(self._libres),
+                "esperando": self._esperando,
+                "checkouts": self._checkouts,
+                "fallos_checkout": self._fallos_checkout,
+                "creadas": self._creadas,
+                "descartadas": self._descartadas,
+                "espera_promedio_ms": round(self._espera_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool():
+    """Crea el pool global (se llama al iniciar la aplicación)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolConexiones()
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+
+def get_pool():
+    return _pool if _pool is not None else init_pool()
+
+
+# --- Capa de acceso asíncrona ---
+# Los routers usan `async with conexion() as db:` sin importar el motor elegido.
+
+Resultado = namedtuple("Resultado", ["rowcount", "lastrowid"])
+
+
+def _medir_consulta(sql, inicio, ejecutada=None):
+    """Reparte el tiempo de una consulta entre ejecución y lectura de filas."""
+    fin = time.perf_counter()
+    if ejecutada is None:
+        ejecutada = fin
+    metricas.registrar("ejecucion", ejecutada - inicio)
+    if ejecutada != fin:
+        metricas.registrar("lectura", fin - ejecutada)
+    metricas.consulta(sql, fin - inicio)
+
+
+class SentenciasPreparadas:
+    """Cursores preparados de una conexión, por texto SQL, con expulsión LRU.
+
+    mysql.connector vuelve a preparar si recibe otro objeto str (compara por
+    identidad), así que se ejecuta siempre con el texto guardado en la entrada.
+    Al expulsar una sentencia se cierra su cursor (COM_STMT_CLOSE en el servidor).
+    """
+
+    def __init__(self, tamano=DB_PREPARED_CACHE):
+        # Sin referencia a la conexión: es la clave débil de _preparadas
+        self.tamano = tamano
+        self._cursores = OrderedDict()  # sql -> (sql, cursor)
+
+    def obtener(self, conn, sql):
+        entrada = self._cursores.get(sql)
+        if entrada is not None:
+            self._cursores.move_to_end(sql)
+            _contadores_preparadas["reutilizadas"] += 1
+            return entrada
+        entrada = self._cursores[sql] = (sql, conn.cursor(prepared=True))
+        _contadores_preparadas["preparadas"] += 1
+        if len(self._cursores) > self.tamano:
+            _, (_, cursor) = self._cursores.popitem(last=False)
+            cursor.close()
+            _contadores_preparadas["expulsadas"] += 1
+        return entrada
+
+
+# Una caché por conexión física; desaparece con ella cuando el pool la descarta
+_preparadas = weakref.WeakKeyDictionary()
+_preparadas_lock = threading.Lock()
+_contadores_preparadas = {"preparadas": 0, "reutilizadas": 0, "expulsadas": 0}
+
+
+def _sentencias(conn):
+    with _preparadas_lock:
+        sentencias = _preparadas.get(conn)
+        if sentencias is None:
+            sentencias = _preparadas[conn] = SentenciasPreparadas()
+        return sentencias
+
+
+class ConexionSync:
+    """Adapta una conexión de mysql.connector: cada llamada bloqueante corre en el threadpool."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.descartar = False  # Quedaron filas sin leer en el socket: no se devuelve al pool
+
+    def _cursor(self, preparada, **opciones):
+        """(sql a ejecutar, cursor, cerrar al terminar)."""
+        if preparada and DB_PREPARED:
+            return (*_sentencias(self.conn).obtener(self.conn, preparada), False)
+        return None, self.conn.cursor(**opciones), True
+
+    def _filas(self, sql, params, preparada):
+        preparado, cursor, cerrar = self._cursor(preparada and sql, buffered=True)
+        try:
+            inicio = time.perf_counter()
+            cursor.execute(preparado or sql, params)
+            ejecutada = time.perf_counter()
+            filas = cursor.fetchall()
+            _medir_consulta(sql, inicio, ejecutada)
+            return cursor.column_names, filas
+        finally:
+            if cerrar:
+                cursor.close()
+
+    def _iniciar(self):
+        # La conexión está en autocommit: la primera escritura abre la transacción que
+        # cierra commit()/rollback(). Una petición que solo lee no necesita ROLLBACK al devolverla.
+        if not self.conn.in_transaction:
+            self.conn.start_transaction()
+
+    def _ejecutar(self, sql, params, muchos, preparada=False):
+        self._iniciar()
+        # executemany sigue en el protocolo de texto: así envía un único INSERT multi-fila
+        preparado, cursor, cerrar = self._cursor(preparada and not muchos and sql)
+        try:
+            inicio = time.perf_counter()
+            if muchos:
+                cursor.executemany(sql, params)
+            else:
+                cursor.execute(preparado or sql, params)
+            _medir_consulta(sql, inicio)
+            return Resultado(cursor.rowcount, cursor.lastrowid)
+        finally:
+            if cerrar:
+                cursor.close()
+
+    async def filas(self, sql, params=(), preparada=False):
+        """(nombres de columnas, filas como tuplas): sin construir un dict por fila.
+
+        Con `preparada` la sentencia se prepara en el servidor la primera vez y
+        después solo se envían los parámetros (protocolo binario).
+        """
+        return await anyio.to_thread.run_sync(self._filas, sql, params, preparada)
+
+    async def execute(self, sql, params=(), preparada=False):
+        return await anyio.to_thread.run_sync(self._ejecutar, sql, params, False, preparada)
+
+    async def executemany(self, sql, params):
+        return await anyio.to_thread.run_sync(self._ejecutar, sql, params, True)
+
+    def _abrir(self, sql, params):
+        cursor = self.conn.cursor()  # Sin buffer: las filas se leen del socket a medida que se piden
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        _medir_consulta(sql, inicio)
+        return cursor
+
+    async def recorrer(self, sql, params=(), lote=LOTE_RECORRIDO):
+        """Lotes de hasta `lote` tuplas con un cursor sin buffer: la memoria no depende del resultado.
+
+        Si el recorrido se interrumpe (p. ej. el cliente se desconecta), la conexión
+        se descarta en lugar de leer el resto de las filas.
+        """
+        cursor = await anyio.to_thread.run_sync(self._abrir, sql, params)
+        completo = False
+        try:
+            while filas := await anyio.to_thread.run_sync(cursor.fetchmany, lote):
+                yield filas
+            completo = True
+        finally:
+            if completo:
+                await anyio.to_thread.run_sync(cursor.close)
+            else:
+                self.descartar = True
+
+    async def begin(self):
+        """Abre la transacción antes de una lectura que debe formar parte de ella (FOR UPDATE, snapshot)."""
+        await anyio.to_thread.run_sync(self._iniciar)
+
+    async def commit(self):
+        with metricas.medir("ejecucion"):
+            await anyio.to_thread.run_sync(self.conn.commit)
+
+    async def rollback(self):
+        await anyio.to_thread.run_sync(self.conn.rollback)
+
+
+class ConexionAsync:
+    """Misma interfaz que ConexionSync sobre una conexión de aiomysql."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.descartar = False
+
+    # aiomysql no tiene sentencias preparadas del lado del servidor: `preparada` no cambia nada
+    async def filas(self, sql, params=(), preparada=False):
+        async with self.conn.cursor() as cursor:
+            inicio = time.perf_counter()
+            await cursor.execute(sql, params)
+            ejecutada = time.perf_counter()
+            filas = await cursor.fetchall()
+            _medir_consulta(sql, inicio, ejecutada)
+            return tuple(columna[0] for columna in cursor.description or ()), filas
+
+    async def _iniciar(self):
+        if not self.conn.get_transaction_status():
+            await self.conn.begin()
+
+    async def execute(self, sql, params=(), preparada=False):
+        await self._iniciar()
+        async with self.conn.cursor() as cursor:
+            inicio = time.perf_counter()
+            await cursor.execute(sql, params)
+            _medir_consulta(sql, inicio)
+            return Resultado(cursor.rowcount, cursor.lastrowid)
+
+    async def executemany(self, sql, params):
+        await self._iniciar()
+        async with self.conn.cursor() as cursor:
+            inicio = time.perf_counter()
+            await cursor.executemany(sql, params)
+            _medir_consulta(sql, inicio)
+            return Resultado(cursor.rowcount, cursor.lastrowid)
+
+    async def recorrer(self, sql, params=(), lote=LOTE_RECORRIDO):
+        # SSCursor: sin buffer, igual que el cursor de ConexionSync.recorrer
+        cursor = await self.conn.cursor(aiomysql.SSCursor)
+        inicio = time.perf_counter()
+        await cursor.execute(sql, params)
+        _medir_consulta(sql, inicio)
+        completo = False
+        try:
+            while filas := await cursor.fetchmany(lote):
+                yield filas
+            completo = True
+        finally:
+            if completo:
+                await cursor.close()
+            else:
+                # SSCursor.close() leería el resto de las filas
+                self.descartar = True
+
+    async def begin(self):
+        await self._iniciar()
+
+    async def commit(self):
+        with metricas.medir("ejecucion"):
+            await self.conn.commit()
+
+    async def rollback(self):
+        await self.conn.rollback()
+
+
+class PoolAsync:
+    """Pool de aiomysql con timeout de espera, ping tras inactividad y estadísticas.
+
+    La concurrencia queda limitada por `tamano` conexiones, no por el número de hilos.
+    """
+
+    def __init__(self, tamano=POOL_SIZE, timeout=POOL_TIMEOUT, ping_interval=POOL_PING_INTERVAL):
+        self.tamano = tamano
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._pool = None
+        self._esperando = 0
+        self._checkouts = 0
+        self._fallos_checkout = 0
+        self._descartadas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    async def abrir(self):
+        config = _config_mysql()
+        self._pool = await aiomysql.create_pool(
+            minsize=0,
+            maxsize=self.tamano,
+            host=config["host"],
+            user=config["user"],
+            password=config["password"],
+            db=config["database"],
+            client_flag=CLIENT.FOUND_ROWS,
+            autocommit=True,
         )
-        return connection
-    except Error as e:
-        print("Error al conectar a MySQL:", e)
+
+    async def obtener(self, timeout=None):
+        inicio = time.monotonic()
+        timeout = self.timeout if timeout is None else timeout
+        self._esperando += 1
+        try:
+            if timeout <= 0 and self._pool.freesize:
+                conn = await self._pool.acquire()  # Sin plazo restante, pero hay una libre: no se espera
+            else:
+                conn = await asyncio.wait_for(self._pool.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._fallos_checkout += 1
+            raise ErrorConexion("Tiempo de espera agotado para obtener una conexión")
+        except Exception as e:
+            self._fallos_checkout += 1
+            print("Error al conectar a MySQL:", e)
+            raise ErrorConexion(str(e)) from e
+        finally:
+            self._esperando -= 1
+
+        if asyncio.get_running_loop().time() - conn.last_usage >= self.ping_interval:
+            try:
+                await conn.ping(reconnect=True)
+            except Exception as e:
+                self._descartadas += 1
+                self._fallos_checkout += 1
+                conn.close()
+                self._pool.release(conn)
+                raise ErrorConexion(str(e)) from e
+
+        espera = time.monotonic() - inicio
+        self._checkouts += 1
+        self._espera_total += espera
+        self._espera_max = max(self._espera_max, espera)
+        return conn
+
+    async def devolver(self, conn, descartar=False):
+        if not descartar and conn.get_transaction_status():
+            # aiomysql cierra las conexiones devueltas con una transacción abierta
+            try:
+                await conn.rollback()
+            except Exception:
+                descartar = True
+        if descartar:
+            self._descartadas += 1
+            conn.close()
+        await self._pool.release(conn)
+
+    async def cerrar(self):
+        self._pool.close()
+        await self._pool.wait_closed()
+
+    def estadisticas(self):
+        abiertas = self._pool.size if self._pool else 0
+        inactivas = self._pool.freesize if self._pool else 0
+        return {
+            "motor": "async",
+            "tamano": self.tamano,
+            "abiertas": abiertas,
+            "en_uso": abiertas - inactivas,
+            "inactivas": inactivas,
+            "esperando": self._esperando,
+            "checkouts": self._checkouts,
+            "fallos_checkout": self._fallos_checkout,
+            "descartadas": self._descartadas,
+            "espera_promedio_ms": round(self._espera_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            "espera_max_ms": round(self._espera_max * 1000, 3),
+        }
+
+
+_pool_async = None
+_pool_async_lock = asyncio.Lock()
+
+
+async def iniciar():
+    """Crea el pool del motor configurado (DB_ENGINE) al arrancar la aplicación."""
+    global _pool_async
+    if DB_ENGINE == "async":
+        async with _pool_async_lock:
+            if _pool_async is None:
+                pool = PoolAsync()
+                await pool.abrir()
+                _pool_async = pool
+    else:
+        init_pool()
+
+
+async def cerrar():
+    global _pool_async
+    if _pool_async is not None:
+        await _pool_async.cerrar()
+        _pool_async = None
+    close_pool()
+
+
+def estadisticas_pool():
+    if DB_ENGINE == "async":
+        return _pool_async.estadisticas() if _pool_async else {"motor": "async", "abiertas": 0}
+    return {"motor": "sync", **get_pool().estadisticas(),
+            **{f"sentencias_{clave}": valor for clave, valor in _contadores_preparadas.items()}}
+
+
+def _espera_maxima():
+    """Segundos que se puede esperar una conexión: POOL_TIMEOUT o lo que quede del plazo."""
+    plazo = plazo_conexion.get()
+    if plazo is None:
         return None
+    return max(0.0, min(POOL_TIMEOUT, plazo - time.monotonic()))
+
+
+@asynccontextmanager
+async def conexion():
+    """Presta una conexión del motor configurado.
 
+        async with conexion() as db:
+            columnas, filas = await db.filas("SELECT id, nombre FROM productos")
+    """
+    if DB_ENGINE == "async":
+        if _pool_async is None:
+            await iniciar()
+        pool = _pool_async
+        with metricas.medir("conexion"):
+            conn = await pool.obtener(_espera_maxima())
+        db = ConexionAsync(conn)
+        try:
+            yield db
+        except (aiomysql.OperationalError, aiomysql.InterfaceError):
+            # La conexión pudo quedar inutilizable
+            with anyio.CancelScope(shield=True):
+                await pool.devolver(conn, descartar=True)
+            raise
+        except BaseException:
+            # Blindado: si la petición se canceló (cliente desconectado en un streaming),
+            # la conexión igual vuelve al pool
+            with anyio.CancelScope(shield=True):
+                await pool.devolver(conn, descartar=db.descartar)
+            raise
+        else:
+            await pool.devolver(conn, descartar=db.descartar)
+    else:
+        # El mismo pool síncrono, usado desde el threadpool
+        pool = get_pool()
+        with metricas.medir("conexion"):
+            conn = await anyio.to_thread.run_sync(pool.obtener, _espera_maxima())
+        db = ConexionSync(conn)
+        try:
+            yield db
+        except Error:
+            with anyio.CancelScope(shield=True):
+                descartar = db.descartar or not await anyio.to_thread.run_sync(conn.is_connected)
+                await anyio.to_thread.run_sync(pool.devolver, conn, descartar)
+            raise
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(pool.devolver, conn, db.descartar)
+            raise
+        else:
+            await anyio.to_thread.run_sync(pool.devolver, conn, db.descartar)
@@ -1,9 +1,47 @@
 # main.py
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware # <--- NUEVA IMPORTACIÓN
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routers import productos, usuarios
+import admision
+import ajustes
+import database
+import cache
+import cambios
+import metricas
+import respuestas
+import resumen
+import seguridad
 
-app = FastAPI(title="API Gutkleid", version="1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El pool de conexiones (del motor DB_ENGINE) se crea una sola vez al arrancar
+    await database.iniciar()
+    seguridad.iniciar()
+    resumen.iniciar()
+    cambios.iniciar()
+    yield
+    await ajustes.cerrar()  # Antes que el pool: escribe los ajustes de stock pendientes
+    await cambios.cerrar()
+    await resumen.cerrar()
+    seguridad.cerrar()
+    await database.cerrar()
+
+
+app = FastAPI(title="API Gutkleid", version="1.0", lifespan=lifespan,
+              default_response_class=respuestas.RespuestaJSON)
+
+# Compresión br/gzip negociada (la más interna: las métricas incluyen su costo)
+app.add_middleware(respuestas.MiddlewareCompresion)
+
+# Latencia por ruta y desglose por fases (se agrega antes que CORS: CORS queda por fuera)
+app.add_middleware(metricas.MiddlewareMetricas)
+
+# Admisión por clase de ruta (por fuera de las métricas: miden solo lo admitido;
+# por dentro de CORS: el navegador puede leer el 503)
+app.add_middleware(admision.MiddlewareAdmision)
 
 # 1. DEFINICIÓN DE ORÍGENES PERMITIDOS
 origins = [
@@ -18,12 +56,86 @@ app.add_middleware(
     allow_credentials=True,     # Permite cookies/tokens
     allow_methods=["*"],        # Permite todos los métodos (GET, POST, PUT, DELETE)
     allow_headers=["*"],        # Permite todos los encabezados
+    # Página siguiente (GET /productos y /productos/search), validación de cache y reintento tras 429/503
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag", "Retry-After"],
 )
 
 # Agregamos los routers
 app.include_router(productos.router)
 app.include_router(usuarios.router)
 
+# Sin conexión disponible (MySQL caído o pool agotado)
+@app.exception_handler(database.ErrorConexion)
+async def error_conexion(request: Request, exc: database.ErrorConexion):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Error al conectar a la base de datos"},
+        headers={"Retry-After": "1"},
+    )
+
+
+# Pool de bcrypt saturado (p. ej. ráfaga de logins)
+@app.exception_handler(seguridad.ErrorSobrecarga)
+async def error_sobrecarga(request: Request, exc: seguridad.ErrorSobrecarga):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Servicio de autenticación saturado, intente de nuevo"},
+        headers={"Retry-After": "1"},
+    )
+
+
 @app.get("/")
 def root():
     return {"message": "API funcionando correctamente"}
+
+
+# Estadísticas del pool de conexiones (para dimensionarlo)
+@app.get("/estado/pool")
+def estado_pool():
+    return database.estadisticas_pool()
+
+
+# Aciertos, fallos y expulsiones del cache de productos
+@app.get("/estado/cache")
+def estado_cache():
+    return cache.cache.estadisticas()
+
+
+# Cola y rechazos del pool de hashing de contraseñas
+@app.get("/estado/hashing")
+def estado_hashing():
+    return seguridad.estadisticas()
+
+
+# Reconciliación del resumen de inventario (GET /productos/stats)
+@app.get("/estado/resumen")
+def estado_resumen():
+    return resumen.estadisticas()
+
+
+# Clientes del stream de eventos y purga de productos eliminados
+@app.get("/estado/cambios")
+def estado_cambios():
+    return cambios.estadisticas()
+
+
+# Ajustes de stock agrupados por ventana (STOCK_COALESCE_MS)
+@app.get("/estado/ajustes")
+def estado_ajustes():
+    return ajustes.estadisticas()
+
+
+# Peticiones admitidas y descartadas por clase, y rechazos del límite de login
+@app.get("/estado/admision")
+def estado_admision():
+    return admision.estadisticas()
+
+
+# Métricas en formato de texto de Prometheus (por proceso)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    extras = metricas.gauges("db_pool", database.estadisticas_pool(), "Pool de conexiones")
+    extras += metricas.gauges("hash_pool", seguridad.estadisticas(), "Pool de procesos de bcrypt")
+    for nombre, valores in admision.estadisticas().items():
+        extras += metricas.gauges(f"admision_{nombre}", valores, "Control de admisión")
+    return PlainTextResponse(metricas.exponer(extras), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,195 @@
+# metricas.py
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+import threading
+import time
+import os
+
+load_dotenv()
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))  # Consultas más lentas se registran en el log
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "si", "yes")
+
+# Fases medidas dentro de una petición (también son los nombres en Server-Timing)
+FASES = ("conexion", "ejecucion", "lectura", "hashing", "serializacion", "compresion")
+
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{n}="{escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._series = {} if etiquetas else {(): 0}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores, cantidad=1):
+        with self._lock:
+            self._series[valores] = self._series.get(valores, 0) + cantidad
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for valores, total in sorted(self._series.items()):
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+class Histograma:
+    """Histograma con buckets fijos, compatible con el formato de texto de Prometheus."""
+
+    def __init__(self, nombre, ayuda, limites, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = limites
+        self.etiquetas = etiquetas
+        self._series = {}  # valores de etiquetas -> [conteo por bucket..., +Inf, suma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [0] * (len(self.limites) + 1) + [0.0]
+            serie[bisect_left(self.limites, valor)] += 1
+            serie[-1] += valor
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = sorted((valores, list(serie)) for valores, serie in self._series.items())
+        nombres = self.etiquetas + ("le",)
+        for valores, serie in series:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + ("+Inf",), serie):
+                acumulado += conteo
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(nombres, valores + (limite,))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+peticiones_duracion = Histograma(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP por ruta",
+    LIMITES_LATENCIA, ("method", "route", "status"),
+)
+peticiones_consultas = Histograma(
+    "http_request_db_queries", "Consultas a la base de datos por petición", LIMITES_CONSULTAS, ("method", "route"),
+)
+fases_duracion = Histograma(
+    "app_phase_duration_seconds", "Tiempo por fase: conexión, ejecución y lectura en la BD, hashing y serialización",
+    LIMITES_LATENCIA, ("fase",),
+)
+consultas_lentas = Contador("db_slow_queries_total", f"Consultas de más de {DB_SLOW_QUERY_MS} ms")
+
+
+# --- Medición de la petición en curso ---
+class Medicion:
+    """Tiempos acumulados de una petición; se comparte con los hilos del motor sync."""
+
+    __slots__ = ("fases", "consultas")
+
+    def __init__(self):
+        self.fases = dict.fromkeys(FASES, 0.0)
+        self.consultas = 0
+
+
+_actual = ContextVar("medicion", default=None)
+
+
+def registrar(fase, segundos):
+    fases_duracion.observar(segundos, fase)
+    medicion = _actual.get()
+    if medicion is not None:
+        medicion.fases[fase] += segundos
+
+
+@contextmanager
+def medir(fase):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(fase, time.perf_counter() - inicio)
+
+
+def consulta(sql, segundos):
+    """Cuenta una consulta de la petición en curso y la registra si fue lenta."""
+    medicion = _actual.get()
+    if medicion is not None:
+        medicion.consultas += 1
+    if segundos * 1000 >= DB_SLOW_QUERY_MS:
+        consultas_lentas.incrementar()
+        print(f"Consulta lenta ({segundos * 1000:.1f} ms): {' '.join(sql.split())[:500]}")
+
+
+def _server_timing(medicion, total):
+    partes = [f"{fase};dur={segundos * 1000:.2f}" for fase, segundos in medicion.fases.items() if segundos]
+    partes.append(f'db;desc="{medicion.consultas} consultas"')
+    partes.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(partes).encode("latin-1")
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: histograma de latencia por ruta y desglose por fases (Server-Timing)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        medicion = Medicion()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                if SERVER_TIMING:
+                    cabeceras = list(mensaje.get("headers", []))
+                    cabeceras.append((b"server-timing", _server_timing(medicion, time.perf_counter() - inicio)))
+                    mensaje = {**mensaje, "headers": cabeceras}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _actual.reset(token)
+            # Plantilla de la ruta (/productos/{id}), no la URL: cardinalidad acotada
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            peticiones_duracion.observar(time.perf_counter() - inicio, scope["method"], ruta, estado)
+            peticiones_consultas.observar(medicion.consultas, scope["method"], ruta)
+
+
+def exponer(extras=()):
+    """Todas las métricas en formato de texto de Prometheus."""
+    lineas = []
+    for metrica in (peticiones_duracion, peticiones_consultas, fases_duracion, consultas_lentas):
+        lineas.extend(metrica.exponer())
+    lineas.extend(extras)
+    return "\n".join(lineas) + "\n"
+
+
+def gauges(prefijo, valores, ayuda):
+    """Convierte un dict de estadísticas numéricas (p. ej. del pool) en gauges."""
+    lineas = []
+    for clave, valor in valores.items():
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            nombre = f"{prefijo}_{clave}"
+            lineas += [f"# HELP {nombre} {ayuda}: {clave}", f"# TYPE {nombre} gauge", f"{nombre} {valor}"]
+    return lineas
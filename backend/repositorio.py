@@ -0,0 +1,372 @@
+# repositorio.py
+"""Todas las consultas de productos, usuarios y el resumen de inventario.
+
+Las filas se leen como tuplas (db.filas) y se devuelven como namedtuples con las
+columnas explícitas de abajo: sin SELECT * y sin un dict por fila. Las sentencias
+con un número fijo de parámetros se piden `preparada=True`; el motor sync las
+prepara en el servidor una vez por conexión (ver database.py).
+"""
+from collections import namedtuple
+from contextlib import aclosing
+
+# Mismo orden que ProductoResponse: las filas se serializan tal cual
+COLUMNAS_PRODUCTO = ("nombre", "descripcion", "precio", "cantidad", "id", "version")
+COLUMNAS_USUARIO = ("id", "nombre", "email", "rol")
+COLUMNAS_RESUMEN = ("slot", "rango", "productos", "unidades", "valor", "bajo_stock", "sin_stock")
+
+Producto = namedtuple("Producto", COLUMNAS_PRODUCTO)
+ProductoRelevancia = namedtuple("ProductoRelevancia", COLUMNAS_PRODUCTO + ("relevancia",))
+ProductoCambio = namedtuple("ProductoCambio", COLUMNAS_PRODUCTO + ("updated_at", "deleted_at"))
+TextoProducto = namedtuple("TextoProducto", ("id", "nombre", "descripcion"))
+Usuario = namedtuple("Usuario", COLUMNAS_USUARIO)
+Credenciales = namedtuple("Credenciales", ("id", "nombre", "rol", "password"))
+FilaResumen = namedtuple("FilaResumen", COLUMNAS_RESUMEN)
+ResumenRango = namedtuple("ResumenRango", COLUMNAS_RESUMEN[1:])
+
+_PRODUCTO = ", ".join(COLUMNAS_PRODUCTO)
+
+# Tope de un INSERT multi-fila: por debajo de max_stmt_length de aiomysql (1.024.000 bytes),
+# que parte un executemany más grande en varias sentencias, y de max_allowed_packet
+INSERT_MAX_BYTES = 512 * 1024
+
+# --- Sentencias de productos ---
+# Las lápidas (deleted_at) solo se leen en el feed de cambios y en la purga
+SQL_PRODUCTO = f"SELECT {_PRODUCTO} FROM productos WHERE id = %s AND deleted_at IS NULL"
+SQL_VERSION = "SELECT version FROM productos WHERE id = %s AND deleted_at IS NULL"
+SQL_INSERTAR = "INSERT INTO productos (nombre, descripcion, precio, cantidad) VALUES (%s, %s, %s, %s)"
+SQL_ELIMINAR = ("UPDATE productos SET deleted_at = NOW(6), version = version + 1 "
+                "WHERE id = %s AND deleted_at IS NULL")
+SQL_ELIMINAR_VERSION = SQL_ELIMINAR + " AND version = %s"
+# Delta atómico: una venta (delta < 0) no puede dejar el stock negativo ni una
+# reposición pasarlo del máximo de la columna. LAST_INSERT_ID(expr) devuelve la
+# cantidad resultante en lastrowid.
+CANTIDAD_MAX = 2147483647  # cantidad es INT
+SQL_AJUSTAR = ("UPDATE productos SET cantidad = LAST_INSERT_ID(cantidad + %s), version = version + 1 "
+               "WHERE id = %s AND deleted_at IS NULL AND (%s >= 0 OR cantidad + %s >= 0) "
+               f"AND cantidad + %s <= {CANTIDAD_MAX}")
+SQL_SUMAR_STOCK = "UPDATE productos SET cantidad = cantidad + %s, version = version + 1 WHERE id = %s"
+
+# Relevancia calculada por el índice FULLTEXT (nombre, descripcion) de init.sql
+SQL_FULLTEXT = f"""
+    SELECT {_PRODUCTO}, MATCH(nombre, descripcion) AGAINST (%s IN NATURAL LANGUAGE MODE) AS relevancia
+    FROM productos
+    WHERE MATCH(nombre, descripcion) AGAINST (%s IN NATURAL LANGUAGE MODE) AND deleted_at IS NULL
+    ORDER BY relevancia DESC, id
+    LIMIT %s OFFSET %s
+"""
+SQL_TEXTOS = "SELECT id, nombre, descripcion FROM productos WHERE deleted_at IS NULL"
+# Recorre el índice primario: sin ordenamiento, la primera fila sale enseguida
+SQL_EXPORTAR = f"SELECT {_PRODUCTO} FROM productos WHERE deleted_at IS NULL ORDER BY id"
+
+# Posición = (updated_at, id); la condición está escrita para recorrer el índice (updated_at, id)
+SQL_CAMBIOS = f"""
+    SELECT {_PRODUCTO}, updated_at, deleted_at
+    FROM productos
+    WHERE updated_at >= %s AND updated_at <= %s AND (updated_at > %s OR id > %s)
+    ORDER BY updated_at, id
+    LIMIT %s
+"""
+SQL_AHORA = "SELECT NOW(6)"
+# Además de NOW(6), el comienzo de la transacción de escritura más antigua de otra conexión
+# que sigue abierta (NULL si no hay). Leer innodb_trx requiere el privilegio PROCESS.
+SQL_AHORA_Y_TRANSACCIONES = """
+    SELECT NOW(6), (
+        SELECT MIN(trx_started) FROM information_schema.innodb_trx
+        WHERE trx_mysql_thread_id <> CONNECTION_ID() AND trx_autocommit_non_locking = 0
+          AND (trx_rows_modified > 0 OR trx_query IS NOT NULL)
+    )
+"""
+SQL_PURGAR = "DELETE FROM productos WHERE deleted_at IS NOT NULL AND deleted_at < %s"
+
+# --- Sentencias del resumen de inventario ---
+# Leer el resumen cuesta lo mismo con 10 o 10 millones de productos: a lo sumo 16 slots x 6 tramos
+SQL_RESUMEN = """
+    SELECT rango, SUM(productos), SUM(unidades), SUM(valor), SUM(bajo_stock), SUM(sin_stock)
+    FROM productos_resumen
+    GROUP BY rango
+"""
+SQL_RESUMEN_SLOTS = f"SELECT {', '.join(COLUMNAS_RESUMEN)} FROM productos_resumen"
+# El mismo resumen calculado desde cero (solo lo usa la reconciliación)
+SQL_RECALCULAR = """
+    SELECT MOD(id, 16) AS slot, rango_precio(precio) AS rango, COUNT(*), SUM(cantidad), SUM(precio * cantidad),
+           SUM(cantidad <= %s), SUM(cantidad <= 0)
+    FROM productos
+    WHERE deleted_at IS NULL
+    GROUP BY slot, rango
+"""
+SQL_SUMAR_RESUMEN = ("UPDATE productos_resumen SET productos = productos + %s, unidades = unidades + %s, "
+                     "valor = valor + %s, bajo_stock = bajo_stock + %s, sin_stock = sin_stock + %s "
+                     "WHERE slot = %s AND rango = %s")
+SQL_INSERTAR_RESUMEN = (f"INSERT INTO productos_resumen ({', '.join(COLUMNAS_RESUMEN)}) "
+                        f"VALUES ({', '.join(['%s'] * len(COLUMNAS_RESUMEN))})")
+
+# --- Sentencias de usuarios ---
+SQL_USUARIO = f"SELECT {', '.join(COLUMNAS_USUARIO)} FROM usuarios WHERE id = %s"
+SQL_CREDENCIALES = "SELECT id, nombre, rol, password FROM usuarios WHERE email = %s"
+SQL_INSERTAR_USUARIO = "INSERT INTO usuarios (nombre, email, password, rol) VALUES (%s, %s, %s, %s)"
+
+
+def _marcadores(valores):
+    return ", ".join(["%s"] * len(valores))
+
+
+def escapar_like(texto):
+    return texto.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def asignaciones(campos):
+    """SET dinámico solo con los campos enviados."""
+    return ", ".join(f"{campo} = %s" for campo in campos), list(campos.values())
+
+
+# --- Productos: lectura ---
+async def listar_productos(db, limit, orden="id", despues=None, precio_min=None, precio_max=None,
+                           stock_min=None, prefijo=None):
+    """Una página de productos por keyset: `despues` es (valor del campo, id) de la última fila entregada.
+
+    `orden` es id, precio, nombre o cantidad (cada uno con su índice (campo, id) en
+    init.sql), con "-" delante para orden descendente.
+    """
+    campo = orden.lstrip("-")
+    direccion = "DESC" if orden.startswith("-") else "ASC"
+    comparador = "<" if orden.startswith("-") else ">"
+
+    condiciones = ["deleted_at IS NULL"]
+    params = []
+    if precio_min is not None:
+        condiciones.append("precio >= %s"); params.append(precio_min)
+    if precio_max is not None:
+        condiciones.append("precio <= %s"); params.append(precio_max)
+    if stock_min is not None:
+        condiciones.append("cantidad >= %s"); params.append(stock_min)
+    if prefijo:
+        condiciones.append("nombre LIKE %s ESCAPE '!'"); params.append(escapar_like(prefijo) + "%")
+    if despues is not None:
+        valor, ultimo_id = despues
+        # Keyset: se continúa después de la última fila entregada, sin OFFSET
+        if campo == "id":
+            condiciones.append(f"id {comparador} %s"); params.append(ultimo_id)
+        else:
+            condiciones.append(f"({campo} {comparador} %s OR ({campo} = %s AND id {comparador} %s))")
+            params.extend([valor, valor, ultimo_id])
+
+    sql = f"SELECT {_PRODUCTO} FROM productos WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {campo} {direccion}" + (f", id {direccion}" if campo != "id" else "")
+    sql += " LIMIT %s"
+    params.append(limit)
+
+    # Hay a lo sumo unas cientos de combinaciones de filtros y orden: vale la pena prepararlas
+    _, filas = await db.filas(sql, tuple(params), preparada=True)
+    return list(map(Producto._make, filas))
+
+
+async def obtener_producto(db, id):
+    _, filas = await db.filas(SQL_PRODUCTO, (id,), preparada=True)
+    return Producto._make(filas[0]) if filas else None
+
+
+async def version_producto(db, id):
+    _, filas = await db.filas(SQL_VERSION, (id,), preparada=True)
+    return filas[0][0] if filas else None
+
+
+async def productos_por_ids(db, ids):
+    _, filas = await db.filas(
+        f"SELECT {_PRODUCTO} FROM productos WHERE id IN ({_marcadores(ids)}) AND deleted_at IS NULL", tuple(ids)
+    )
+    return list(map(Producto._make, filas))
+
+
+async def stock_productos(db, ids, bloquear=False):
+    """{id: cantidad}. Con `bloquear` las filas quedan bloqueadas (en orden de id) hasta el commit."""
+    sql = f"SELECT id, cantidad FROM productos WHERE id IN ({_marcadores(ids)}) AND deleted_at IS NULL ORDER BY id"
+    _, filas = await db.filas(sql + (" FOR UPDATE" if bloquear else ""), tuple(ids))
+    return dict(filas)
+
+
+async def productos_existentes(db, ids):
+    _, filas = await db.filas(
+        f"SELECT id FROM productos WHERE id IN ({_marcadores(ids)}) AND deleted_at IS NULL", tuple(ids)
+    )
+    return {fila[0] for fila in filas}
+
+
+async def buscar_fulltext(db, texto, limit, offset=0):
+    _, filas = await db.filas(SQL_FULLTEXT, (texto, texto, limit, offset), preparada=True)
+    return list(map(ProductoRelevancia._make, filas))
+
+
+async def textos_productos(db):
+    """Lo que indexa la búsqueda en memoria."""
+    _, filas = await db.filas(SQL_TEXTOS, preparada=True)
+    return list(map(TextoProducto._make, filas))
+
+
+async def recorrer_productos(db, lote):
+    """El catálogo completo en orden de id, en listas de hasta `lote` tuplas (COLUMNAS_PRODUCTO).
+
+    Quedan como tuplas: se escriben enseguida en la respuesta y no vale la pena
+    construir una namedtuple por fila.
+    """
+    async with aclosing(db.recorrer(SQL_EXPORTAR, lote=lote)) as lotes:
+        async for filas in lotes:
+            yield filas
+
+
+async def cambios_productos(db, desde, hasta, limit):
+    """Filas (también lápidas) escritas después de la posición `desde` y hasta `hasta`, en orden."""
+    fecha, ultimo_id = desde
+    _, filas = await db.filas(SQL_CAMBIOS, (fecha, hasta, fecha, ultimo_id, limit), preparada=True)
+    return list(map(ProductoCambio._make, filas))
+
+
+async def ahora(db):
+    """NOW(6) de la base de datos."""
+    _, filas = await db.filas(SQL_AHORA, preparada=True)
+    return filas[0][0]
+
+
+async def ahora_y_transacciones(db):
+    """(NOW(6), trx_started de la transacción de escritura en curso más antigua o None)."""
+    _, filas = await db.filas(SQL_AHORA_Y_TRANSACCIONES, preparada=True)
+    return filas[0]
+
+
+# --- Productos: escritura (sin commit; lo decide quien llama) ---
+async def crear_producto(db, nombre, descripcion, precio, cantidad):
+    """Devuelve el id nuevo."""
+    resultado = await db.execute(SQL_INSERTAR, (nombre, descripcion, precio, cantidad), preparada=True)
+    return resultado.lastrowid
+
+
+def _grupos_insert(filas, maximo=INSERT_MAX_BYTES):
+    """Parte las filas en grupos que caben en una sola sentencia INSERT."""
+    grupo, tamano = [], 0
+    for fila in filas:
+        # Cota del texto escapado: cada byte puede duplicarse, más comillas y separadores
+        bytes_fila = sum(2 * len(str(valor).encode("utf-8")) + 4 for valor in fila)
+        if grupo and tamano + bytes_fila > maximo:
+            yield grupo
+            grupo, tamano = [], 0
+        grupo.append(fila)
+        tamano += bytes_fila
+    if grupo:
+        yield grupo
+
+
+async def insertar_productos(db, filas):
+    """Inserta (nombre, descripcion, precio, cantidad) con INSERT multi-fila y devuelve los ids.
+
+    InnoDB asigna ids consecutivos a un INSERT con número de filas conocido,
+    empezando en su lastrowid. Por eso cada executemany lleva solo las filas que
+    caben en una sentencia: si el driver lo partiera, lastrowid sería el de la última.
+    """
+    ids = []
+    for grupo in _grupos_insert(filas):
+        resultado = await db.executemany(SQL_INSERTAR, grupo)
+        ids.extend(range(resultado.lastrowid, resultado.lastrowid + len(grupo)))
+    return ids
+
+
+async def actualizar_producto(db, id, campos, version=None):
+    """UPDATE en un solo viaje: rowcount indica si existía (conexiones con FOUND_ROWS) y
+    lastrowid, vía LAST_INSERT_ID(version + 1), trae la versión resultante.
+
+    Con `version` solo actualiza si la fila sigue en esa versión (If-Match).
+    """
+    sets, params = asignaciones(campos)
+    sql = (f"UPDATE productos SET {sets}, version = LAST_INSERT_ID(version + 1) "
+           "WHERE id = %s AND deleted_at IS NULL")
+    params.append(id)
+    if version is not None:
+        sql += " AND version = %s"; params.append(version)
+    return await db.execute(sql, tuple(params), preparada=True)
+
+
+async def actualizar_productos(db, columnas, filas):
+    """Mismo conjunto de columnas para todas las filas: (valores..., id)."""
+    sets, _ = asignaciones(dict.fromkeys(columnas))
+    return await db.executemany(
+        f"UPDATE productos SET {sets}, version = version + 1 WHERE id = %s AND deleted_at IS NULL", filas
+    )
+
+
+async def ajustar_stock(db, id, delta):
+    """rowcount 0 si no existe o la cantidad quedaría fuera de rango; si no, lastrowid es la cantidad nueva."""
+    return await db.execute(SQL_AJUSTAR, (delta, id, delta, delta, delta), preparada=True)
+
+
+async def sumar_stock(db, filas):
+    """(delta, id) por fila, sin condición: quien llama ya bloqueó y validó las filas."""
+    await db.executemany(SQL_SUMAR_STOCK, filas)
+
+
+async def eliminar_producto(db, id, version=None):
+    """Eliminación lógica: la fila queda como lápida para el feed de cambios. Devuelve rowcount."""
+    if version is None:
+        resultado = await db.execute(SQL_ELIMINAR, (id,), preparada=True)
+    else:
+        resultado = await db.execute(SQL_ELIMINAR_VERSION, (id, version), preparada=True)
+    return resultado.rowcount
+
+
+async def eliminar_productos(db, ids):
+    await db.execute(
+        "UPDATE productos SET deleted_at = NOW(6), version = version + 1 "
+        f"WHERE id IN ({_marcadores(ids)}) AND deleted_at IS NULL",
+        tuple(ids)
+    )
+
+
+async def purgar_eliminados(db, antes):
+    """Borra de verdad las lápidas anteriores a `antes`. Devuelve rowcount."""
+    resultado = await db.execute(SQL_PURGAR, (antes,))
+    return resultado.rowcount
+
+
+# --- Resumen de inventario ---
+async def resumen_por_rango(db):
+    """Totales del resumen por tramo de precio."""
+    _, filas = await db.filas(SQL_RESUMEN, preparada=True)
+    return list(map(ResumenRango._make, filas))
+
+
+async def resumen_slots(db):
+    """Filas del resumen tal como están."""
+    _, filas = await db.filas(SQL_RESUMEN_SLOTS)
+    return list(map(FilaResumen._make, filas))
+
+
+async def recalcular_resumen(db, stock_bajo):
+    """El resumen calculado desde productos, con las mismas filas que resumen_slots()."""
+    _, filas = await db.filas(SQL_RECALCULAR, (stock_bajo,))
+    return list(map(FilaResumen._make, filas))
+
+
+async def sumar_resumen(db, deltas):
+    """Suma cada FilaResumen de `deltas` a su fila (slot, rango); la crea si no existe.
+
+    Sumar conmuta con los deltas de los triggers: no hace falta bloquear el resumen.
+    """
+    for delta in deltas:
+        resultado = await db.execute(SQL_SUMAR_RESUMEN, (*delta[2:], delta.slot, delta.rango), preparada=True)
+        if not resultado.rowcount:
+            await db.execute(SQL_INSERTAR_RESUMEN, tuple(delta), preparada=True)
+
+
+# --- Usuarios ---
+async def crear_usuario(db, nombre, email, password, rol="usuario"):
+    """`password` ya viene hasheado. Devuelve el id nuevo."""
+    resultado = await db.execute(SQL_INSERTAR_USUARIO, (nombre, email, password, rol), preparada=True)
+    return resultado.lastrowid
+
+
+async def obtener_usuario(db, id):
+    _, filas = await db.filas(SQL_USUARIO, (id,), preparada=True)
+    return Usuario._make(filas[0]) if filas else None
+
+
+async def credenciales(db, email):
+    """Lo necesario para el login, incluido el hash de la contraseña."""
+    _, filas = await db.filas(SQL_CREDENCIALES, (email,), preparada=True)
+    return Credenciales._make(filas[0]) if filas else None
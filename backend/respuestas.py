@@ -0,0 +1,146 @@
+# respuestas.py
+from datetime import date, datetime
+from decimal import Decimal
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from dotenv import load_dotenv
+import gzip
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin orjson se usa json de la biblioteca estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: sin brotli solo se ofrece gzip
+    brotli = None
+
+load_dotenv()
+
+COMPRESION_MINIMA = int(os.getenv("COMPRESION_MINIMA", "1024"))  # Bytes; respuestas menores van sin comprimir
+GZIP_NIVEL = int(os.getenv("GZIP_NIVEL", "5"))
+BROTLI_CALIDAD = int(os.getenv("BROTLI_CALIDAD", "4"))
+
+TIPOS_COMPRIMIBLES = ("application/json", "text/", "application/x-ndjson")
+
+
+# --- JSON ---
+def _por_defecto(valor):
+    # DECIMAL de MySQL -> número, igual que el float de ProductoResponse
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} no es serializable a JSON")
+
+
+def dumps(datos) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(datos, default=_por_defecto)
+    return json.dumps(datos, default=_por_defecto, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def filas_json(columnas, filas) -> bytes:
+    """Tuplas tal como las devuelve el cursor -> arreglo JSON de objetos, sin modelos intermedios."""
+    return dumps([dict(zip(columnas, fila)) for fila in filas])
+
+
+def filas_ndjson(columnas, filas) -> bytes:
+    """Un objeto JSON por línea (exportación en streaming)."""
+    return b"".join(dumps(dict(zip(columnas, fila))) + b"\n" for fila in filas)
+
+
+class RespuestaJSON(JSONResponse):
+    """Respuesta por defecto de la API: orjson si está instalado."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# --- Compresión negociada ---
+def _negociar(accept_encoding):
+    """Elige br o gzip según Accept-Encoding (respetando q=0); None si ninguno aplica."""
+    preferencias = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        calidad = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                calidad = float(parametros.strip()[2:])
+            except ValueError:
+                calidad = 0.0
+        preferencias[nombre.strip().lower()] = calidad
+    comodin = preferencias.get("*", 0.0)
+    disponibles = (["br"] if brotli is not None else []) + ["gzip"]
+    opciones = [(preferencias.get(c, comodin), -i, c) for i, c in enumerate(disponibles)]
+    calidad, _, elegida = max(opciones)
+    return elegida if calidad > 0 else None
+
+
+def codificacion_para(cuerpo, accept_encoding, minimo=COMPRESION_MINIMA):
+    """br/gzip para un cuerpo ya serializado, o None si se envía tal cual."""
+    if len(cuerpo) < minimo or not accept_encoding:
+        return None
+    return _negociar(accept_encoding)
+
+
+def comprimir(cuerpo, codificacion):
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=BROTLI_CALIDAD)
+    return gzip.compress(cuerpo, compresslevel=GZIP_NIVEL, mtime=0)
+
+
+class MiddlewareCompresion:
+    """Comprime con br/gzip las respuestas grandes de un solo bloque.
+
+    Las respuestas en streaming (importación/exportación) pasan intactas: comprimirlas
+    obligaría a retenerlas en memoria. Las que ya traen Content-Encoding también: las
+    respuestas cacheadas de productos se comprimen una sola vez junto a su entrada.
+    """
+
+    def __init__(self, app, minimo=COMPRESION_MINIMA):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        codificacion = _negociar(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            return await self.app(scope, receive, send)
+
+        inicio = None
+
+        async def enviar(mensaje):
+            nonlocal inicio
+            if mensaje["type"] == "http.response.start":
+                inicio = mensaje  # Se retiene hasta ver el primer bloque del cuerpo
+                return
+            if inicio is None:
+                return await send(mensaje)
+            primero, inicio = inicio, None
+            cabeceras = MutableHeaders(raw=list(primero.get("headers", [])))
+            cuerpo = mensaje.get("body", b"")
+            comprimible = (
+                not mensaje.get("more_body", False)
+                and len(cuerpo) >= self.minimo
+                and "content-encoding" not in cabeceras
+                and cabeceras.get("content-type", "").startswith(TIPOS_COMPRIMIBLES)
+            )
+            if not comprimible:
+                await send(primero)
+                return await send(mensaje)
+            cuerpo = comprimir(cuerpo, codificacion)
+            cabeceras["content-encoding"] = codificacion
+            cabeceras["content-length"] = str(len(cuerpo))
+            cabeceras.add_vary_header("Accept-Encoding")
+            etag = cabeceras.get("etag")
+            if etag and not etag.startswith("W/"):
+                cabeceras["etag"] = "W/" + etag  # Otra representación: el ETag pasa a ser débil
+            await send({**primero, "headers": cabeceras.raw})
+            await send({**mensaje, "body": cuerpo})
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,128 @@
+# resumen.py
+from dotenv import load_dotenv
+from decimal import Decimal
+import asyncio
+import time
+import os
+from database import conexion
+import repositorio
+
+load_dotenv()
+
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "300"))  # Segundos entre reconciliaciones
+
+STOCK_BAJO = 5  # Debe coincidir con el procedimiento resumen_sumar de init.sql
+
+# Etiquetas de los tramos que calcula rango_precio() en init.sql: (desde, hasta)
+RANGOS_PRECIO = [(0, 10), (10, 50), (50, 100), (100, 500), (500, 1000), (1000, None)]
+
+
+async def obtener(db):
+    """Estadísticas de inventario a partir del resumen mantenido por los triggers."""
+    por_rango = {fila.rango: fila for fila in await repositorio.resumen_por_rango(db)}
+    total = lambda campo: sum(int(getattr(fila, campo) or 0) for fila in por_rango.values())
+    return {
+        "productos": total("productos"),
+        "unidades": total("unidades"),
+        "valor_total": float(sum(Decimal(str(fila.valor or 0)) for fila in por_rango.values())),
+        "bajo_stock": total("bajo_stock"),
+        "sin_stock": total("sin_stock"),
+        "umbral_bajo_stock": STOCK_BAJO,
+        "distribucion_precios": [
+            {"desde": desde, "hasta": hasta,
+             "productos": int(por_rango[rango].productos or 0) if rango in por_rango else 0}
+            for rango, (desde, hasta) in enumerate(RANGOS_PRECIO)
+        ],
+    }
+
+
+# --- Reconciliación periódica ---
+_tarea = None
+_ultima = None          # time.time() de la última reconciliación
+_correcciones = 0       # Filas del resumen corregidas desde el arranque
+_errores = 0
+
+
+_CERO = (None, None, 0, 0, Decimal(0), 0, 0)
+
+
+def _normalizar(fila):
+    return repositorio.FilaResumen._make(
+        Decimal(str(valor or 0)) if campo == "valor" else int(valor or 0) for campo, valor in fila._asdict().items()
+    )
+
+
+async def reconciliar():
+    """Recalcula el resumen desde productos y corrige las filas que se desviaron.
+
+    El recálculo recorre la tabla sin bloquear nada: resumen y recálculo se leen en
+    la misma instantánea (REPEATABLE READ, el aislamiento por defecto de InnoDB), y
+    como cada trigger escribe su delta en la transacción de la escritura, la
+    diferencia entre ambos es el desvío real. Después, en una transacción corta, se
+    suma ese desvío a las filas afectadas: una suma conmuta con los deltas que
+    escriben mientras tanto los triggers, así que no se pierde ni duplica ninguno.
+    Devuelve la cantidad de filas corregidas.
+    """
+    global _ultima, _correcciones
+    async with conexion() as db:
+        await db.begin()
+        try:
+            actual = {(f.slot, f.rango): _normalizar(f) for f in await repositorio.resumen_slots(db)}
+            esperado = {(f.slot, f.rango): _normalizar(f) for f in await repositorio.recalcular_resumen(db, STOCK_BAJO)}
+        finally:
+            await db.rollback()  # Solo lecturas: cierra la instantánea
+        deltas = []
+        for slot, rango in actual.keys() | esperado.keys():
+            a = actual.get((slot, rango), _CERO)
+            e = esperado.get((slot, rango), _CERO)
+            if a[2:] != e[2:]:
+                deltas.append(repositorio.FilaResumen(slot, rango, *(x - y for x, y in zip(e[2:], a[2:]))))
+        if deltas:
+            try:
+                await repositorio.sumar_resumen(db, sorted(deltas))  # En orden: igual que lo bloquearía otro worker
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+    _ultima = time.time()
+    _correcciones += len(deltas)
+    return len(deltas)
+
+
+async def _reconciliar_siempre():
+    global _errores
+    while True:
+        try:
+            corregidas = await reconciliar()
+            if corregidas:
+                print(f"Resumen de inventario: {corregidas} filas corregidas")
+        except Exception as e:
+            _errores += 1
+            print(f"Error al reconciliar el resumen de inventario: {e}")
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+
+
+def iniciar():
+    global _tarea
+    if _tarea is None and STATS_RECONCILE_INTERVAL > 0:
+        _tarea = asyncio.create_task(_reconciliar_siempre())
+
+
+async def cerrar():
+    global _tarea
+    if _tarea is not None:
+        _tarea.cancel()
+        try:
+            await _tarea
+        except asyncio.CancelledError:
+            pass
+        _tarea = None
+
+
+def estadisticas():
+    return {
+        "intervalo": STATS_RECONCILE_INTERVAL,
+        "ultima_reconciliacion": _ultima,
+        "filas_corregidas": _correcciones,
+        "errores": _errores,
+    }
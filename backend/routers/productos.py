@@ -1,127 +1,721 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Header, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi import status
-from database import get_connection
-from schemas.producto_schemas import ProductoCreate, ProductoResponse, ProductoUpdate
+from pydantic import ValidationError
+from typing import Literal, Optional
+from contextlib import aclosing
+from decimal import Decimal, ROUND_HALF_UP
+from database import conexion, ErrorConexion
+from schemas.producto_schemas import (
+    ProductoCreate, ProductoResponse, ProductoUpdate, ProductoPatch, ProductoBusqueda,
+    ProductoBulkUpdate, ProductoBulkDelete, ResultadoBulk, ResultadoImportacion, CambiosProductos,
+    AjusteStock, ResultadoAjuste,
+)
+import ajustes
+import asyncio
+import busqueda
+import cache
+import cambios
+import metricas
+import repositorio
+import respuestas
+import resumen
+import base64
+import codecs
+import csv
+import io
+import json
+import os
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
 
-# 📌 Obtener todos los productos
+LIMITE_DEFECTO = 100
+LIMITE_MAXIMO = 500
+
+BULK_CHUNK = int(os.getenv("BULK_CHUNK", "500"))           # Filas por transacción en operaciones masivas
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))  # Máximo de elementos por petición JSON
+IMPORT_MAX_ERRORES = 100                                    # Errores detallados en la respuesta de importación
+IMPORT_MAX_LINE = int(os.getenv("IMPORT_MAX_LINE", "65536"))  # Caracteres máximos por línea o registro importado
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "1000"))      # Filas por lectura del cursor en /productos/export
+
+# Órdenes permitidos; cada campo tiene un índice (campo, id) en init.sql
+Orden = Literal["id", "-id", "precio", "-precio", "nombre", "-nombre", "cantidad", "-cantidad"]
+
+
+def _codificar_cursor(orden, fila):
+    valor = getattr(fila, orden.lstrip("-"))
+    if isinstance(valor, Decimal):
+        valor = str(valor)
+    datos = json.dumps([orden, valor, fila.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decodificar_cursor(cursor, orden):
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        orden_cursor, valor, ultimo_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if orden.lstrip("-") == "precio":
+            valor = Decimal(valor)  # Literal numérico para que MySQL use el índice
+    except (ValueError, TypeError, ArithmeticError):
+        raise ValueError("Cursor inválido")
+    if orden_cursor != orden or not isinstance(ultimo_id, int):
+        raise ValueError("El cursor no corresponde al orden solicitado")
+    return valor, ultimo_id
+
+
+def _serializar(columnas, filas, cabeceras=None, etag=None, uno=False):
+    """Filas del repositorio -> JSON una sola vez (sin pasar por Pydantic) y su ETag; es lo que se cachea.
+
+    El response_model de cada ruta queda para la documentación: el repositorio ya
+    selecciona exactamente sus campos.
+    """
+    with metricas.medir("serializacion"):
+        if uno:
+            cuerpo = respuestas.dumps(dict(zip(columnas, filas)))
+        else:
+            cuerpo = respuestas.filas_json(columnas, filas)
+    return cache.Entrada(cuerpo, {**(cabeceras or {}), "ETag": etag or cache.calcular_etag(cuerpo)}, {})
+
+
+async def _responder(entrada, if_none_match, accept_encoding, clave):
+    """200 o 304 para una entrada del cache, comprimida según Accept-Encoding.
+
+    El cuerpo comprimido se guarda en la entrada: los aciertos de cache no vuelven a
+    comprimir. Una representación comprimida lleva el ETag débil, y el 304 usa la
+    misma forma que tendría el 200 para esa petición.
+    """
+    cabeceras = dict(entrada.cabeceras)
+    cuerpo = entrada.cuerpo
+    codificacion = respuestas.codificacion_para(cuerpo, accept_encoding)
+    if len(cuerpo) >= respuestas.COMPRESION_MINIMA:
+        cabeceras["Vary"] = "Accept-Encoding"
+    if codificacion is not None:
+        cabeceras["ETag"] = "W/" + cabeceras["ETag"]
+    if cache.etag_coincide(if_none_match, entrada.cabeceras["ETag"]):
+        return Response(status_code=304, headers={k: v for k, v in cabeceras.items() if k in ("ETag", "Vary")})
+    if codificacion is not None:
+        cuerpo = entrada.comprimidos.get(codificacion)
+        if cuerpo is None:
+            with metricas.medir("compresion"):
+                cuerpo = entrada.comprimidos[codificacion] = respuestas.comprimir(entrada.cuerpo, codificacion)
+            await cache.cache.actualizar(clave, entrada)
+        cabeceras["Content-Encoding"] = codificacion
+    return Response(content=cuerpo, media_type="application/json", headers=cabeceras)
+
+
+async def _notificar_escritura():
+    """Tras cualquier escritura en productos: invalida el cache y despierta el feed de eventos."""
+    await cache.invalidar()
+    cambios.avisar()
+
+
+# 📌 Obtener productos (paginación por cursor, filtros y orden)
 @router.get("/", response_model=list[ProductoResponse])
-def get_productos():
-    conn = get_connection()
-    if conn is None:
-        return JSONResponse(status_code=500, content={"error": "Error al conectar a la base de datos"})
-    
-    cursor = conn.cursor(dictionary=True)
+async def get_productos(
+    limit: int = Query(LIMITE_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    after: Optional[str] = Query(None, description="Cursor recibido en la cabecera X-Next-Cursor"),
+    precio_min: Optional[float] = Query(None, ge=0),
+    precio_max: Optional[float] = Query(None, ge=0),
+    stock_min: Optional[int] = Query(None, ge=0),
+    nombre: Optional[str] = Query(None, min_length=1, description="Prefijo del nombre"),
+    orden: Orden = "id",
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    clave = await cache.clave_lista(dict(limit=limit, after=after, precio_min=precio_min, precio_max=precio_max,
+                                   stock_min=stock_min, nombre=nombre, orden=orden))
+    entrada = await cache.cache.obtener(clave)
+    if entrada is not None:
+        return await _responder(entrada, if_none_match, accept_encoding, clave)
+
     try:
-        cursor.execute("SELECT * FROM productos")
-        productos = cursor.fetchall()
-        return productos
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error al obtener productos: {e}"})
+        despues = _decodificar_cursor(after, orden) if after else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    async with conexion() as db:
+        try:
+            # La fila extra indica si hay página siguiente
+            productos = await repositorio.listar_productos(db, limit + 1, orden, despues, precio_min, precio_max,
+                                                           stock_min, nombre)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al obtener productos: {e}"})
+
+    cabeceras = {}
+    if len(productos) > limit:
+        productos = productos[:limit]
+        cabeceras["X-Next-Cursor"] = _codificar_cursor(orden, productos[-1])
+    entrada = _serializar(repositorio.Producto._fields, productos, cabeceras)
+    await cache.cache.guardar(clave, entrada)
+    return await _responder(entrada, if_none_match, accept_encoding, clave)
+
+
+# 📌 Buscar productos por texto en nombre y descripción (declarada antes de /{id})
+@router.get("/search", response_model=list[ProductoBusqueda])
+async def buscar_productos(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=LIMITE_MAXIMO),
+    offset: int = Query(0, ge=0),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    # Solo se sirven los primeros SEARCH_MAX_RESULTS resultados por relevancia
+    if offset + limit > busqueda.SEARCH_MAX_RESULTS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"offset + limit no puede superar {busqueda.SEARCH_MAX_RESULTS}; refine la búsqueda"}
+        )
+    if not busqueda.tokenizar(q):
+        return JSONResponse(status_code=400, content={"error": "La búsqueda no contiene palabras indexables"})
+
+    clave = await cache.clave_busqueda(dict(q=q, limit=limit, offset=offset))
+    entrada = await cache.cache.obtener(clave)
+    if entrada is not None:
+        return await _responder(entrada, if_none_match, accept_encoding, clave)
+
+    async with conexion() as db:
+        try:
+            productos = await busqueda.buscar(db, q, limit + 1, offset)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al buscar productos: {e}"})
+
+    cabeceras = {}
+    if len(productos) > limit:
+        productos = productos[:limit]
+        if offset + limit < busqueda.SEARCH_MAX_RESULTS:
+            cabeceras["X-Next-Offset"] = str(offset + limit)
+    entrada = _serializar(repositorio.ProductoRelevancia._fields, productos, cabeceras)
+    await cache.cache.guardar(clave, entrada)
+    return await _responder(entrada, if_none_match, accept_encoding, clave)
+
+
+# 📌 Estadísticas de inventario (valor total, bajo stock, distribución de precios)
+@router.get("/stats")
+async def estadisticas_productos():
+    async with conexion() as db:
+        try:
+            return await resumen.obtener(db)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al obtener estadísticas: {e}"})
+
+
+# 📌 Cambios desde un token: altas y modificaciones completas, eliminaciones como ids
+@router.get("/changes", response_model=CambiosProductos)
+async def cambios_productos(
+    since: Optional[str] = Query(None, description="Token de la respuesta anterior; sin él, el token actual"),
+    limit: int = Query(LIMITE_MAXIMO, ge=1, le=LIMITE_MAXIMO),
+):
+    """Sincronización incremental de una copia local de la lista.
+
+    Sin `since` no devuelve filas, solo el token de ahora: el cliente lo guarda,
+    descarga la lista completa y desde entonces pide solo los cambios. Si
+    `hay_mas` es true, se vuelve a pedir enseguida con el token recibido.
+    """
+    try:
+        desde = cambios.decodificar(since) if since else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    async with conexion() as db:
+        try:
+            hasta = await cambios.limite(db)
+            if desde is None:
+                return {"actualizados": [], "eliminados": [], "token": cambios.codificar((hasta, 0)), "hay_mas": False}
+            if cambios.expirado(desde, hasta):
+                return JSONResponse(status_code=410,
+                                    content={"error": "Token demasiado antiguo; recargue la lista completa"})
+            lote, hay_mas = await cambios.leer(db, desde, hasta, limit)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al obtener cambios: {e}"})
+
+    with metricas.medir("serializacion"):
+        cuerpo = respuestas.dumps({
+            "actualizados": [c.datos for c in lote if c.tipo != "delete"],
+            "eliminados": [c.datos["id"] for c in lote if c.tipo == "delete"],
+            # Sin cambios el token igual avanza hasta `hasta`, para no caducar en clientes inactivos
+            "token": cambios.codificar(lote[-1].posicion if lote else max(desde, (hasta, 0))),
+            "hay_mas": hay_mas,
+        })
+    return Response(content=cuerpo, media_type="application/json")
+
+
+async def _eventos(desde):
+    cola = cambios.difusor.suscribir()
+    try:
+        yield "retry: 2000\n\n"  # También envía las cabeceras sin esperar al primer cambio
+        ultima = desde
+        if desde is not None:
+            # Reconexión: primero lo que el cliente se perdió, leído de la base de datos
+            async with conexion() as db:
+                hasta = await cambios.limite(db)
+                hay_mas = True
+                while hay_mas:
+                    lote, hay_mas = await cambios.leer(db, ultima, hasta, cambios.LOTE)
+                    for cambio in lote:
+                        yield cambios.evento_sse(cambio)
+                    if lote:
+                        ultima = lote[-1].posicion
+        while True:
+            try:
+                cambio = await asyncio.wait_for(cola.get(), cambios.CHANGES_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if cambio is None:
+                return  # Cortado por lento: el navegador reconecta con Last-Event-ID
+            if ultima is not None and cambio.posicion <= ultima:
+                continue  # Ya enviado al ponerse al día
+            yield cambios.evento_sse(cambio)
     finally:
-        cursor.close()
-        conn.close()
+        cambios.difusor.cancelar(cola)
+
+
+# 📌 Eventos create/update/delete en vivo (Server-Sent Events)
+@router.get("/events")
+async def eventos_productos(
+    since: Optional[str] = Query(None, description="Token desde el que reenviar los cambios"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Cada evento lleva como id el token de /productos/changes: EventSource lo reenvía
+    en Last-Event-ID al reconectar y el stream continúa sin perder cambios."""
+    token = last_event_id or since
+    try:
+        desde = cambios.decodificar(token) if token else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return StreamingResponse(_eventos(desde), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _csv(filas):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(filas)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def _exportar(formato):
+    columnas = repositorio.COLUMNAS_PRODUCTO
+    if formato == "csv":
+        yield _csv([columnas])  # Encabezados: el primer byte sale antes de consultar
+    # Un error a mitad de camino corta la respuesta (sin el bloque final): el cliente
+    # ve una descarga incompleta, no un archivo truncado que parece válido.
+    # aclosing: si se corta, el cursor se cierra antes de devolver la conexión
+    async with conexion() as db, aclosing(repositorio.recorrer_productos(db, EXPORT_CHUNK)) as lotes:
+        async for filas in lotes:
+            yield _csv(filas) if formato == "csv" else respuestas.filas_ndjson(columnas, filas)
+
+
+# 📌 Exportar el catálogo completo en CSV o NDJSON (streaming)
+@router.get("/export")
+async def exportar_productos(format: Literal["csv", "ndjson"] = "ndjson"):
+    """Mismas columnas que GET /productos, en orden de id.
+
+    Las filas se leen con un cursor sin buffer de a EXPORT_CHUNK y se envían a
+    medida que llegan: la memoria y el tiempo al primer byte no dependen del
+    tamaño del catálogo. La conexión queda tomada mientras dure la descarga.
+    """
+    tipo = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(_exportar(format), media_type=tipo,
+                             headers={"Content-Disposition": f'attachment; filename="productos.{format}"'})
+
+
+# --- Operaciones masivas (declaradas antes de /{id}) ---
+def _lotes(items):
+    for inicio in range(0, len(items), BULK_CHUNK):
+        yield inicio, items[inicio:inicio + BULK_CHUNK]
+
+
+def _resumen(resultados, exitoso):
+    exitosos = sum(1 for r in resultados if r["estado"] == exitoso)
+    return {"total": len(resultados), "exitosos": exitosos, "fallidos": len(resultados) - exitosos,
+            "resultados": resultados}
+
+
+def _demasiados():
+    return JSONResponse(status_code=413, content={"error": f"Máximo {BULK_MAX_ITEMS} elementos por petición"})
+
+
+async def _insertar_lote(db, filas):
+    """Inserta un lote en una sola transacción y devuelve sus ids."""
+    try:
+        ids = await repositorio.insertar_productos(db, filas)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return ids
+
+
+# 📌 Crear productos en lote
+@router.post("/bulk", response_model=ResultadoBulk)
+async def crear_productos_bulk(productos: list[ProductoCreate]):
+    if len(productos) > BULK_MAX_ITEMS:
+        return _demasiados()
+    resultados = []
+    async with conexion() as db:
+        for inicio, lote in _lotes(productos):
+            filas = [(p.nombre, p.descripcion, p.precio, p.cantidad) for p in lote]
+            try:
+                ids = await _insertar_lote(db, filas)
+            except Exception as e:
+                resultados.extend({"indice": inicio + i, "estado": "error", "error": str(e)} for i in range(len(lote)))
+                continue
+            resultados.extend({"indice": inicio + i, "id": ids[i], "estado": "creado"} for i in range(len(lote)))
+    await _notificar_escritura()
+    return _resumen(resultados, "creado")
+
+
+# 📌 Actualizar productos en lote (solo los campos enviados)
+@router.patch("/bulk", response_model=ResultadoBulk)
+async def actualizar_productos_bulk(productos: list[ProductoBulkUpdate]):
+    if len(productos) > BULK_MAX_ITEMS:
+        return _demasiados()
+    resultados = []
+    async with conexion() as db:
+        for inicio, lote in _lotes(productos):
+            parcial = []
+            try:
+                existentes = await repositorio.productos_existentes(db, [p.id for p in lote])
+                # Un executemany por cada combinación de campos enviada
+                grupos = {}
+                for i, p in enumerate(lote):
+                    campos = p.model_dump(exclude_unset=True, exclude={"id"})
+                    if p.id not in existentes:
+                        parcial.append({"indice": inicio + i, "id": p.id, "estado": "no_encontrado"})
+                    elif not campos:
+                        parcial.append({"indice": inicio + i, "id": p.id, "estado": "error",
+                                        "error": "Sin campos para actualizar"})
+                    else:
+                        grupos.setdefault(tuple(campos), []).append(tuple(campos.values()) + (p.id,))
+                        parcial.append({"indice": inicio + i, "id": p.id, "estado": "actualizado"})
+                for columnas, filas in grupos.items():
+                    await repositorio.actualizar_productos(db, columnas, filas)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                parcial = [{"indice": inicio + i, "id": p.id, "estado": "error", "error": str(e)}
+                           for i, p in enumerate(lote)]
+            resultados.extend(parcial)
+    await _notificar_escritura()
+    return _resumen(resultados, "actualizado")
+
+
+# 📌 Eliminar productos en lote
+@router.delete("/bulk", response_model=ResultadoBulk)
+async def eliminar_productos_bulk(datos: ProductoBulkDelete):
+    if len(datos.ids) > BULK_MAX_ITEMS:
+        return _demasiados()
+    resultados = []
+    async with conexion() as db:
+        for inicio, lote in _lotes(datos.ids):
+            try:
+                existentes = await repositorio.productos_existentes(db, lote)
+                if existentes:
+                    await repositorio.eliminar_productos(db, existentes)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                resultados.extend({"indice": inicio + i, "id": id, "estado": "error", "error": str(e)}
+                                  for i, id in enumerate(lote))
+                continue
+            resultados.extend({"indice": inicio + i, "id": id,
+                               "estado": "eliminado" if id in existentes else "no_encontrado"}
+                              for i, id in enumerate(lote))
+    await _notificar_escritura()
+    return _resumen(resultados, "eliminado")
+
+
+class _LineaLarga(Exception):
+    """Una línea (o un registro CSV con saltos de línea) supera IMPORT_MAX_LINE caracteres."""
+
+
+async def _lineas(request):
+    """Entrega el cuerpo como texto, línea a línea (con su salto), a medida que llega.
+
+    Cada trozo se decodifica y se parte una sola vez, sin volver a recorrer lo
+    anterior; el BOM inicial se descarta.
+    """
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    partes, tamano = [], 0  # Comienzo de una línea que todavía no terminó
+    async for trozo in request.stream():
+        *completas, resto = decodificador.decode(trozo).split("\n")
+        for linea in completas:
+            if partes:
+                linea = "".join(partes) + linea
+                partes, tamano = [], 0
+            if len(linea) > IMPORT_MAX_LINE:
+                raise _LineaLarga()
+            yield linea + "\n"
+        if resto:
+            partes.append(resto)
+            tamano += len(resto)
+            if tamano > IMPORT_MAX_LINE:
+                raise _LineaLarga()
+    resto = "".join(partes) + decodificador.decode(b"", final=True)
+    if len(resto) > IMPORT_MAX_LINE:
+        raise _LineaLarga()
+    if resto:
+        yield resto
+
+
+# 📌 Importar productos desde CSV o NDJSON (streaming)
+@router.post("/import", response_model=ResultadoImportacion)
+async def importar_productos(request: Request, format: Literal["csv", "ndjson"] = "ndjson"):
+    """Importa un archivo enviado como cuerpo de la petición.
+
+    CSV: primera línea con encabezados (nombre, descripcion, precio, cantidad),
+    un registro por línea; un campo entre comillas puede contener saltos de línea.
+    NDJSON: un objeto JSON por línea. Las filas válidas se insertan en lotes de
+    BULK_CHUNK; la conexión solo se toma para cada lote. Una línea o registro de
+    más de IMPORT_MAX_LINE caracteres corta la importación con 413: lo anterior
+    queda importado y la respuesta lo detalla.
+    """
+    insertados = 0
+    fallidos = 0
+    errores = []
+    lote = []       # (número de línea, fila)
+    encabezados = None
+
+    def registrar_error(numero, mensaje):
+        nonlocal fallidos
+        fallidos += 1
+        if len(errores) < IMPORT_MAX_ERRORES:
+            errores.append({"linea": numero, "error": mensaje})
+
+    async def volcar():
+        nonlocal insertados
+        filas = [fila for _, fila in lote]
+        try:
+            async with conexion() as db:
+                await _insertar_lote(db, filas)
+            insertados += len(filas)
+        except Exception as e:
+            for numero, _ in lote:
+                registrar_error(numero, str(e))
+        lote.clear()
+
+    registro = []   # Líneas del registro CSV en curso: más de una si un campo entre comillas tiene saltos
+    largo = 0
+    numero = 0
+    inicio = 0      # Línea donde empieza el registro en curso
+    try:
+        async for linea in _lineas(request):
+            numero += 1
+            try:
+                if format == "csv":
+                    if not registro:
+                        inicio = numero
+                    registro.append(linea)
+                    largo += len(linea)
+                    if largo > IMPORT_MAX_LINE:
+                        raise _LineaLarga()
+                    try:
+                        valores = next(csv.reader(registro, strict=True))
+                    except csv.Error as e:
+                        if "unexpected end of data" in str(e):
+                            continue  # Un campo entre comillas sigue en la línea siguiente
+                        # Texto tras una comilla de cierre ('"a"b'): se lee como sin strict
+                        valores = next(csv.reader(registro))
+                    registro.clear()
+                    largo = 0
+                    if not any(v.strip() for v in valores):
+                        continue
+                    if encabezados is None:
+                        encabezados = [v.strip() for v in valores]
+                        continue
+                    datos = dict(zip(encabezados, valores))
+                    datos["descripcion"] = datos.get("descripcion") or None
+                else:
+                    inicio = numero
+                    if not linea.strip():
+                        continue
+                    datos = json.loads(linea)
+                p = ProductoCreate.model_validate(datos)
+            except ValidationError as e:
+                registrar_error(inicio, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            except (ValueError, csv.Error) as e:
+                registrar_error(inicio, str(e))
+                continue
+            lote.append((inicio, (p.nombre, p.descripcion, p.precio, p.cantidad)))
+            if len(lote) >= BULK_CHUNK:
+                await volcar()
+        if registro:
+            registrar_error(inicio, "Comillas sin cerrar al final del archivo")
+    except _LineaLarga:
+        if lote:
+            await volcar()
+        if insertados:
+            await _notificar_escritura()
+        linea_larga = inicio if registro else numero + 1
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"La línea {linea_larga} supera {IMPORT_MAX_LINE} caracteres; importación interrumpida",
+                     "insertados": insertados, "fallidos": fallidos, "errores": errores}
+        )
+    if lote:
+        await volcar()
+
+    if insertados:
+        await _notificar_escritura()
+    return {"insertados": insertados, "fallidos": fallidos, "errores": errores}
 
 
 # 📌 Obtener producto por ID
 @router.get("/{id}", response_model=ProductoResponse)
-def get_producto(id: int):
-    conn = get_connection()
-    if conn is None:
-        return JSONResponse(status_code=500, content={"error": "Error al conectar a la base de datos"})
-    
-    cursor = conn.cursor(dictionary=True)
+async def get_producto(id: int, if_none_match: Optional[str] = Header(None),
+                       accept_encoding: Optional[str] = Header(None)):
+    clave = await cache.clave_producto(id)
+    entrada = await cache.cache.obtener(clave)
+    if entrada is not None:
+        return await _responder(entrada, if_none_match, accept_encoding, clave)
+
+    async with conexion() as db:
+        try:
+            producto = await repositorio.obtener_producto(db, id)
+            if producto is None:
+                return JSONResponse(status_code=404, content={"error": "Producto no encontrado"})
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al obtener producto: {e}"})
+
+    entrada = _serializar(producto._fields, producto, etag=_etag_version(producto.version), uno=True)
+    await cache.cache.guardar(clave, entrada)
+    return await _responder(entrada, if_none_match, accept_encoding, clave)
+
+
+# --- Escrituras en un solo viaje a la base de datos ---
+# La existencia se deduce de rowcount (conexiones con FOUND_ROWS) y la respuesta se
+# arma con el payload: lastrowid trae el id nuevo o, vía LAST_INSERT_ID(version + 1),
+# la versión resultante de un UPDATE.
+def _etag_version(version):
+    return f'"v{version}"'
+
+
+def _version_esperada(if_match):
+    """Versión exigida por If-Match; None si no se envió o es '*'."""
+    if not if_match or if_match.strip() == "*":
+        return None
+    etiqueta = if_match.split(",")[0].strip().removeprefix("W/").strip('"')
     try:
-        cursor.execute("SELECT * FROM productos WHERE id = %s", (id,))
-        producto = cursor.fetchone()
-        if not producto:
-            return JSONResponse(status_code=404, content={"error": "Producto no encontrado"})
-        return producto
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error al obtener producto: {e}"})
-    finally:
-        cursor.close()
-        conn.close()
+        return int(etiqueta.removeprefix("v"))
+    except ValueError:
+        return 0  # Ninguna fila tiene versión 0: termina en 412
+
+
+def _respuesta_producto(response, id, version, campos):
+    if "precio" in campos:
+        # Como MySQL al guardar en DECIMAL(10,2): desde el decimal escrito y mitades hacia afuera
+        # (round() de Python redondea el binario y al par: round(1.005, 2) == 1.0)
+        campos["precio"] = float(Decimal(repr(campos["precio"])).quantize(Decimal("0.01"), ROUND_HALF_UP))
+    response.headers["ETag"] = _etag_version(version)
+    return {**campos, "id": id, "version": version}
+
+
+async def _fallo_escritura(db, id, version):
+    """Camino de error (rowcount = 0): con If-Match distingue 412 de 404."""
+    if version is not None:
+        actual = await repositorio.version_producto(db, id)
+        if actual is not None:
+            return JSONResponse(status_code=412, content={"error": "El producto fue modificado por otra petición"},
+                                headers={"ETag": _etag_version(actual)})
+    return JSONResponse(status_code=404, content={"error": "Producto no encontrado"})
+
+
+async def _actualizar(db, id, campos, version):
+    resultado = await repositorio.actualizar_producto(db, id, campos, version)
+    await db.commit()
+    return resultado
 
 
 # 📌 Crear producto
 @router.post("/", response_model=ProductoResponse)
-def crear_producto(producto: ProductoCreate):
-    conn = get_connection()
-    if conn is None:
-        return JSONResponse(status_code=500, content={"error": "Error al conectar a la base de datos"})
-
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "INSERT INTO productos (nombre, descripcion, precio, cantidad) VALUES (%s, %s, %s, %s)",
-            (producto.nombre, producto.descripcion, producto.precio, producto.cantidad)
-        )
-        conn.commit()
-        producto_id = cursor.lastrowid
-        cursor.execute("SELECT * FROM productos WHERE id = %s", (producto_id,))
-        nuevo = cursor.fetchone()
-        return nuevo
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error al crear producto: {e}"})
-    finally:
-        cursor.close()
-        conn.close()
+async def crear_producto(producto: ProductoCreate, response: Response):
+    async with conexion() as db:
+        try:
+            id = await repositorio.crear_producto(
+                db, producto.nombre, producto.descripcion, producto.precio, producto.cantidad
+            )
+            await db.commit()
+            await _notificar_escritura()
+            return _respuesta_producto(response, id, 1, producto.model_dump())
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al crear producto: {e}"})
 
 
 # 📌 Actualizar producto
 @router.put("/{id}", response_model=ProductoResponse)
-def actualizar_producto(id: int, producto: ProductoUpdate):
-    conn = get_connection()
-    if conn is None:
-        return JSONResponse(status_code=500, content={"error": "Error al conectar a la base de datos"})
+async def actualizar_producto(id: int, producto: ProductoUpdate, response: Response,
+                              if_match: Optional[str] = Header(None)):
+    version = _version_esperada(if_match)
+    async with conexion() as db:
+        try:
+            resultado = await _actualizar(db, id, producto.model_dump(), version)
+            if resultado.rowcount == 0:
+                return await _fallo_escritura(db, id, version)
+            await _notificar_escritura()
+            return _respuesta_producto(response, id, resultado.lastrowid, producto.model_dump())
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al actualizar producto: {e}"})
 
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM productos WHERE id = %s", (id,))
-        existente = cursor.fetchone()
-        if not existente:
-            return JSONResponse(status_code=404, content={"error": "Producto no encontrado"})
-
-        cursor.execute(
-            "UPDATE productos SET nombre = %s, descripcion = %s, precio = %s, cantidad = %s WHERE id = %s",
-            (producto.nombre, producto.descripcion, producto.precio, producto.cantidad, id)
-        )
-        conn.commit()
-        cursor.execute("SELECT * FROM productos WHERE id = %s", (id,))
-        actualizado = cursor.fetchone()
-        return actualizado
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error al actualizar producto: {e}"})
-    finally:
-        cursor.close()
-        conn.close()
+
+# 📌 Actualizar parcialmente un producto (solo los campos enviados)
+@router.patch("/{id}")
+async def modificar_producto(id: int, producto: ProductoPatch, response: Response,
+                             if_match: Optional[str] = Header(None)):
+    campos = producto.model_dump(exclude_unset=True)
+    if not campos:
+        return JSONResponse(status_code=400, content={"error": "Sin campos para actualizar"})
+    version = _version_esperada(if_match)
+    async with conexion() as db:
+        try:
+            resultado = await _actualizar(db, id, campos, version)
+            if resultado.rowcount == 0:
+                return await _fallo_escritura(db, id, version)
+            await _notificar_escritura()
+            # Solo se devuelven los campos modificados, sin releer la fila
+            return _respuesta_producto(response, id, resultado.lastrowid, campos)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al actualizar producto: {e}"})
 
 
 # 📌 Eliminar producto
 @router.delete("/{id}")
-def eliminar_producto(id: int):
-    conn = get_connection()
-    if conn is None:
-        return JSONResponse(status_code=500, content={"error": "Error al conectar a la base de datos"})
+async def eliminar_producto(id: int, if_match: Optional[str] = Header(None)):
+    version = _version_esperada(if_match)
+    async with conexion() as db:
+        try:
+            # Eliminación lógica: la fila queda como lápida para GET /productos/changes
+            eliminados = await repositorio.eliminar_producto(db, id, version)
+            await db.commit()
+            if eliminados == 0:
+                return await _fallo_escritura(db, id, version)
+            await _notificar_escritura()
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={"message": "Producto eliminado correctamente"}
+            )
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al eliminar producto: {e}"})
 
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM productos WHERE id = %s", (id,))
-        existente = cursor.fetchone()
-        if not existente:
-            return JSONResponse(status_code=404, content={"error": "Producto no encontrado"})
 
-        cursor.execute("DELETE FROM productos WHERE id = %s", (id,))
-        conn.commit()
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content={"message": "Producto eliminado correctamente"}
-        )
+# 📌 Ajustar el stock con un delta (ventas y reposiciones concurrentes sin leer antes)
+@router.post("/{id}/ajuste", response_model=ResultadoAjuste)
+async def ajustar_stock(id: int, ajuste: AjusteStock):
+    if ajuste.delta == 0:
+        return JSONResponse(status_code=400, content={"error": "El delta no puede ser 0"})
+    try:
+        resultado = await ajustes.ajustar(id, ajuste.delta)
+    except ErrorConexion:
+        raise
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error al eliminar producto: {e}"})
-    finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": f"Error al ajustar stock: {e}"})
+    if resultado.estado == "no_encontrado":
+        return JSONResponse(status_code=404, content={"error": "Producto no encontrado"})
+    if resultado.estado == "stock_insuficiente":
+        return JSONResponse(status_code=409,
+                            content={"error": "Stock insuficiente", "disponible": resultado.cantidad})
+    if resultado.estado == "fuera_de_rango":
+        return JSONResponse(status_code=422,
+                            content={"error": "La cantidad resultante supera el máximo", "disponible": resultado.cantidad})
+    await _notificar_escritura()
+    return {"id": id, "cantidad": resultado.cantidad}
@@ -1,63 +1,56 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import JSONResponse
-from database import get_connection
+from database import conexion
+import admision
+import repositorio
 from schemas.usuario_schemas import UsuarioCreate, UsuarioResponse, LoginRequest
-import bcrypt
+from seguridad import crear_token, hashear_password, usuario_actual, verificar_password, SESSION_TTL
 
 router = APIRouter(prefix="/usuarios", tags=["Usuarios"])
 
 # Registrar usuario
 @router.post("/registro", response_model=UsuarioResponse)
-def registrar_usuario(usuario: UsuarioCreate):
-    conn = get_connection()
-    if conn is None:
-        return JSONResponse(status_code=500, content={"error": "Error al conectar a la base de datos"})
-
-    cursor = conn.cursor(dictionary=True)
-    try:
-        # Encriptar contraseña
-        hashed_pw = bcrypt.hashpw(usuario.password.encode('utf-8'), bcrypt.gensalt())
-
-        cursor.execute(
-            "INSERT INTO usuarios (nombre, email, password) VALUES (%s, %s, %s)",
-            (usuario.nombre, usuario.email, hashed_pw.decode('utf-8'))
-        )
-        conn.commit()
-        user_id = cursor.lastrowid
-
-        cursor.execute("SELECT id, nombre, email, rol FROM usuarios WHERE id = %s", (user_id,))
-        nuevo_usuario = cursor.fetchone()
-
-        return nuevo_usuario
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error al registrar usuario: {e}"})
-    finally:
-        cursor.close()
-        conn.close()
+async def registrar_usuario(usuario: UsuarioCreate):
+    # Encriptar contraseña (en el pool de procesos de bcrypt)
+    hashed_pw = await hashear_password(usuario.password)
 
+    async with conexion() as db:
+        try:
+            id = await repositorio.crear_usuario(db, usuario.nombre, usuario.email, hashed_pw)
+            await db.commit()
 
-# Login de usuario
-@router.post("/login")
-def login(usuario: LoginRequest):
-    conn = get_connection()
-    if conn is None:
-        return JSONResponse(status_code=500, content={"error": "Error al conectar a la base de datos"})
-
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM usuarios WHERE email = %s", (usuario.email,))
-        user = cursor.fetchone()
-
-        if not user or not bcrypt.checkpw(usuario.password.encode('utf-8'), user["password"].encode('utf-8')):
-            return JSONResponse(status_code=401, content={"error": "Credenciales incorrectas"})
-
-        return {"message": "Login exitoso", "usuario": {"id": user["id"], "nombre": user["nombre"], "rol": user["rol"]}}
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error en login: {e}"})
-    finally:
-        cursor.close()
-        conn.close()
-
+            nuevo_usuario = await repositorio.obtener_usuario(db, id)
 
+            return nuevo_usuario._asdict()
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error al registrar usuario: {e}"})
 
 
+# Login de usuario
+@router.post("/login")
+async def login(usuario: LoginRequest, request: Request):
+    # Antes de tocar la base de datos o bcrypt: por IP y por cuenta
+    rechazo = admision.limitar_login(request.client.host if request.client else "", usuario.email)
+    if rechazo is not None:
+        return rechazo
+
+    async with conexion() as db:
+        try:
+            user = await repositorio.credenciales(db, usuario.email)
+        except Exception as e:
+            return JSONResponse(status_code=500, content={"error": f"Error en login: {e}"})
+
+    # La verificación se hace después de devolver la conexión al pool
+    if not user or not await verificar_password(usuario.password, user.password):
+        return JSONResponse(status_code=401, content={"error": "Credenciales incorrectas"})
+
+    datos = {"id": user.id, "nombre": user.nombre, "rol": user.rol}
+    # Token firmado: las siguientes peticiones se validan sin volver a pasar por bcrypt
+    return {"message": "Login exitoso", "usuario": datos, "token": crear_token(datos),
+            "token_type": "bearer", "expira_en": SESSION_TTL}
+
+
+# Usuario de la sesión actual (valida solo la firma del token, sin base de datos)
+@router.get("/me")
+async def usuario_sesion(sesion: dict = Depends(usuario_actual)):
+    return {"id": sesion["sub"], "nombre": sesion["nombre"], "rol": sesion["rol"]}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional
 
 class ProductoBase(BaseModel):
@@ -13,8 +13,66 @@ class ProductoCreate(ProductoBase):
 class ProductoUpdate(ProductoBase):
     pass
 
+class ProductoPatch(BaseModel):
+    nombre: Optional[str] = None
+    descripcion: Optional[str] = None
+    precio: Optional[float] = None
+    cantidad: Optional[int] = None
+
+    # Un campo omitido no cambia; null solo vale para descripcion (las demás columnas son NOT NULL)
+    @field_validator("nombre", "precio", "cantidad")
+    @classmethod
+    def no_nulo(cls, valor):
+        if valor is None:
+            raise ValueError("no puede ser null")
+        return valor
+
 class ProductoResponse(ProductoBase):
     id: int
+    version: int = 1
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ProductoBusqueda(ProductoResponse):
+    relevancia: float
+
+# --- Operaciones masivas ---
+class ProductoBulkUpdate(ProductoPatch):
+    id: int
+
+class ProductoBulkDelete(BaseModel):
+    ids: list[int]
+
+class ResultadoItem(BaseModel):
+    indice: int
+    id: Optional[int] = None
+    estado: str
+    error: Optional[str] = None
+
+class ResultadoBulk(BaseModel):
+    total: int
+    exitosos: int
+    fallidos: int
+    resultados: list[ResultadoItem]
+
+class ResultadoImportacion(BaseModel):
+    insertados: int
+    fallidos: int
+    errores: list[dict]
+
+# --- Ajuste de stock ---
+class AjusteStock(BaseModel):
+    # Negativo para ventas, positivo para reposiciones; dentro del rango de la columna INT
+    delta: int = Field(ge=-2147483648, le=2147483647)
+
+class ResultadoAjuste(BaseModel):
+    id: int
+    cantidad: int
+
+# --- Sincronización incremental ---
+class CambiosProductos(BaseModel):
+    actualizados: list[ProductoResponse]
+    eliminados: list[int]
+    token: str
+    hay_mas: bool
@@ -0,0 +1,152 @@
+# seguridad.py
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import Header, HTTPException
+from typing import Optional
+from dotenv import load_dotenv
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import secrets
+import time
+import bcrypt
+import metricas
+
+load_dotenv()
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))                # Procesos dedicados a bcrypt
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "2"))  # Segundos máximos esperando un proceso libre
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))             # Factor de costo de bcrypt
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))               # Vigencia del token en segundos
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+
+if not SESSION_SECRET:
+    SESSION_SECRET = secrets.token_hex(32)
+    print("SESSION_SECRET no definido: se usa uno aleatorio (los tokens no sobreviven reinicios ni se comparten entre workers)")
+    # Los procesos de hashing importan este módulo de cero: que hereden el secreto sin repetir el aviso
+    os.environ["SESSION_SECRET"] = SESSION_SECRET
+
+
+class ErrorSobrecarga(Exception):
+    """No hubo un proceso de hashing libre dentro de HASH_QUEUE_TIMEOUT."""
+
+
+# --- Hashing (corre dentro de los procesos del pool) ---
+def hashear(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def verificar(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        return False
+
+
+_executor = None
+_cupos = asyncio.Semaphore(HASH_WORKERS)
+_en_espera = 0
+_rechazos = 0
+_completados = 0
+
+
+def iniciar():
+    global _executor
+    if _executor is None:
+        # forkserver: los procesos no se bifurcan desde el servidor, que ya tiene hilos vivos
+        # (threadpool, pool de MySQL) cuyos locks podrían quedar tomados en el hijo
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload([__name__])  # Se importa una vez en el forkserver, no en cada proceso
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=contexto)
+        # Se arrancan todos ahora y no en los primeros logins, que pagarían el arranque del proceso
+        for futuro in [_executor.submit(hashear, "", 4) for _ in range(HASH_WORKERS)]:
+            futuro.result()
+
+
+def cerrar():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _en_pool(funcion, *args):
+    """Ejecuta `funcion` en el pool de procesos sin encolar más trabajos que procesos."""
+    global _en_espera, _rechazos, _completados
+    iniciar()
+    _en_espera += 1
+    try:
+        await asyncio.wait_for(_cupos.acquire(), HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _rechazos += 1
+        raise ErrorSobrecarga("Demasiadas solicitudes de autenticación en curso")
+    finally:
+        _en_espera -= 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, funcion, *args)
+    finally:
+        _cupos.release()
+        _completados += 1
+
+
+async def hashear_password(password: str) -> str:
+    with metricas.medir("hashing"):
+        return await _en_pool(hashear, password)
+
+
+async def verificar_password(password: str, hashed: str) -> bool:
+    with metricas.medir("hashing"):
+        return await _en_pool(verificar, password, hashed)
+
+
+def estadisticas():
+    return {
+        "procesos": HASH_WORKERS,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "en_espera": _en_espera,
+        "completados": _completados,
+        "rechazos": _rechazos,
+    }
+
+
+# --- Tokens de sesión firmados (sin estado en el servidor) ---
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).decode("ascii").rstrip("=")
+
+
+def _firmar(contenido: str) -> str:
+    return _b64(hmac.new(SESSION_SECRET.encode("utf-8"), contenido.encode("ascii"), hashlib.sha256).digest())
+
+
+def crear_token(usuario: dict) -> str:
+    datos = {"sub": usuario["id"], "nombre": usuario["nombre"], "rol": usuario["rol"],
+             "exp": int(time.time()) + SESSION_TTL}
+    contenido = _b64(json.dumps(datos, separators=(",", ":")).encode("utf-8"))
+    return f"{contenido}.{_firmar(contenido)}"
+
+
+def verificar_token(token: str) -> Optional[dict]:
+    """Devuelve los datos del token si la firma es válida y no expiró."""
+    try:
+        contenido, firma = token.split(".")
+        if not hmac.compare_digest(firma, _firmar(contenido)):
+            return None
+        datos = json.loads(base64.urlsafe_b64decode(contenido + "=" * (-len(contenido) % 4)))
+    except (ValueError, UnicodeEncodeError):
+        return None
+    if datos.get("exp", 0) < time.time():
+        return None
+    return datos
+
+
+async def usuario_actual(authorization: Optional[str] = Header(None)) -> dict:
+    """Dependencia para rutas protegidas: `Authorization: Bearer <token>`."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=401, detail="Token requerido")
+    datos = verificar_token(authorization[7:].strip())
+    if datos is None:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    return datos
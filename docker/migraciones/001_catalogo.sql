@@ -0,0 +1,144 @@
+-- Migración de una base creada con una versión anterior de init.sql.
+--
+-- docker/mysql-init solo se ejecuta cuando el volumen mysql_data está vacío: una
+-- instalación existente no recibe las columnas, índices, tabla de resumen, función y
+-- triggers nuevos. Este script los agrega. Es idempotente (cada paso comprueba si ya
+-- está hecho) y no hace nada dañino sobre una base creada con el init.sql actual.
+--
+-- Aplicar con el backend detenido (los triggers se recrean y el resumen se recalcula):
+--   docker compose stop backend
+--   docker compose exec -T db mysql -uroot -proot_password my_database < docker/migraciones/001_catalogo.sql
+--   docker compose start backend
+--
+-- Agregar el índice FULLTEXT reconstruye la tabla productos: con muchas filas tarda.
+--
+-- El feed de cambios lee information_schema.innodb_trx, que requiere el privilegio
+-- PROCESS. root ya lo tiene; si el backend usa otro DB_USER:
+--   GRANT PROCESS ON *.* TO 'usuario'@'%';
+-- o bien CHANGES_TRACK_TRANSACTIONS=false en .env (ver backend/cambios.py).
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS migracion_columna$$
+CREATE PROCEDURE migracion_columna(tabla VARCHAR(64), columna VARCHAR(64), definicion TEXT)
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = DATABASE() AND table_name = tabla AND column_name = columna) THEN
+        SET @ddl = CONCAT('ALTER TABLE ', tabla, ' ADD COLUMN ', columna, ' ', definicion);
+        PREPARE sentencia FROM @ddl;
+        EXECUTE sentencia;
+        DEALLOCATE PREPARE sentencia;
+    END IF;
+END$$
+
+DROP PROCEDURE IF EXISTS migracion_indice$$
+CREATE PROCEDURE migracion_indice(tabla VARCHAR(64), indice VARCHAR(64), definicion TEXT)
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.statistics
+                   WHERE table_schema = DATABASE() AND table_name = tabla AND index_name = indice) THEN
+        SET @ddl = CONCAT('ALTER TABLE ', tabla, ' ADD ', definicion);
+        PREPARE sentencia FROM @ddl;
+        EXECUTE sentencia;
+        DEALLOCATE PREPARE sentencia;
+    END IF;
+END$$
+
+DELIMITER ;
+
+-- Columnas de productos (mismas definiciones que init.sql)
+CALL migracion_columna('productos', 'version', 'INT NOT NULL DEFAULT 1 AFTER cantidad');
+CALL migracion_columna('productos', 'updated_at',
+    'TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6) AFTER created_at');
+CALL migracion_columna('productos', 'deleted_at', 'TIMESTAMP(6) NULL DEFAULT NULL AFTER updated_at');
+
+-- Índices de productos
+CALL migracion_indice('productos', 'idx_productos_cambios', 'INDEX idx_productos_cambios (updated_at, id)');
+CALL migracion_indice('productos', 'idx_productos_eliminados', 'INDEX idx_productos_eliminados (deleted_at)');
+CALL migracion_indice('productos', 'idx_productos_precio', 'INDEX idx_productos_precio (precio, id)');
+CALL migracion_indice('productos', 'idx_productos_cantidad', 'INDEX idx_productos_cantidad (cantidad, id)');
+CALL migracion_indice('productos', 'idx_productos_nombre', 'INDEX idx_productos_nombre (nombre, id)');
+CALL migracion_indice('productos', 'ft_productos_texto', 'FULLTEXT INDEX ft_productos_texto (nombre, descripcion)');
+
+DROP PROCEDURE migracion_columna;
+DROP PROCEDURE migracion_indice;
+
+-- Resumen de inventario (ver init.sql)
+CREATE TABLE IF NOT EXISTS productos_resumen (
+    slot TINYINT NOT NULL,
+    rango TINYINT NOT NULL,
+    productos INT NOT NULL DEFAULT 0,
+    unidades BIGINT NOT NULL DEFAULT 0,
+    valor DECIMAL(20,2) NOT NULL DEFAULT 0,
+    bajo_stock INT NOT NULL DEFAULT 0,
+    sin_stock INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (slot, rango)
+);
+
+-- Función, procedimiento y triggers: se recrean para quedar iguales a init.sql
+DROP TRIGGER IF EXISTS productos_resumen_insert;
+DROP TRIGGER IF EXISTS productos_resumen_update;
+DROP TRIGGER IF EXISTS productos_resumen_delete;
+DROP PROCEDURE IF EXISTS resumen_sumar;
+DROP FUNCTION IF EXISTS rango_precio;
+
+DELIMITER $$
+
+CREATE FUNCTION rango_precio(p DECIMAL(10,2)) RETURNS TINYINT DETERMINISTIC NO SQL
+RETURN CASE
+    WHEN p < 10 THEN 0
+    WHEN p < 50 THEN 1
+    WHEN p < 100 THEN 2
+    WHEN p < 500 THEN 3
+    WHEN p < 1000 THEN 4
+    ELSE 5
+END$$
+
+CREATE PROCEDURE resumen_sumar(p_id INT, p_precio DECIMAL(10,2), p_cantidad INT, signo INT)
+BEGIN
+    INSERT INTO productos_resumen (slot, rango, productos, unidades, valor, bajo_stock, sin_stock)
+    VALUES (p_id % 16, rango_precio(p_precio), signo, signo * p_cantidad, signo * p_precio * p_cantidad,
+            signo * (p_cantidad <= 5), signo * (p_cantidad <= 0)) AS d
+    ON DUPLICATE KEY UPDATE
+        productos = productos_resumen.productos + d.productos,
+        unidades = productos_resumen.unidades + d.unidades,
+        valor = productos_resumen.valor + d.valor,
+        bajo_stock = productos_resumen.bajo_stock + d.bajo_stock,
+        sin_stock = productos_resumen.sin_stock + d.sin_stock;
+END$$
+
+CREATE TRIGGER productos_resumen_insert AFTER INSERT ON productos FOR EACH ROW
+BEGIN
+    CALL resumen_sumar(NEW.id, NEW.precio, NEW.cantidad, 1);
+END$$
+
+CREATE TRIGGER productos_resumen_update AFTER UPDATE ON productos FOR EACH ROW
+BEGIN
+    IF OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL THEN
+        CALL resumen_sumar(OLD.id, OLD.precio, OLD.cantidad, -1);
+    ELSEIF OLD.deleted_at IS NOT NULL AND NEW.deleted_at IS NULL THEN
+        CALL resumen_sumar(NEW.id, NEW.precio, NEW.cantidad, 1);
+    ELSEIF NEW.deleted_at IS NULL AND (NEW.precio <> OLD.precio OR NEW.cantidad <> OLD.cantidad) THEN
+        CALL resumen_sumar(OLD.id, OLD.precio, OLD.cantidad, -1);
+        CALL resumen_sumar(NEW.id, NEW.precio, NEW.cantidad, 1);
+    END IF;
+END$$
+
+CREATE TRIGGER productos_resumen_delete AFTER DELETE ON productos FOR EACH ROW
+BEGIN
+    IF OLD.deleted_at IS NULL THEN
+        CALL resumen_sumar(OLD.id, OLD.precio, OLD.cantidad, -1);
+    END IF;
+END$$
+
+DELIMITER ;
+
+-- El resumen se recalcula desde cero: sin el backend corriendo no hay deltas en vuelo
+START TRANSACTION;
+DELETE FROM productos_resumen;
+INSERT INTO productos_resumen (slot, rango, productos, unidades, valor, bajo_stock, sin_stock)
+SELECT MOD(id, 16) AS slot, rango_precio(precio) AS rango, COUNT(*), SUM(cantidad), SUM(precio * cantidad),
+       SUM(cantidad <= 5), SUM(cantidad <= 0)
+FROM productos
+WHERE deleted_at IS NULL
+GROUP BY slot, rango;
+COMMIT;
@@ -1,3 +1,6 @@
+-- Solo corre al crear el volumen de datos. Todo cambio de esquema necesita también
+-- un script idempotente en docker/migraciones para las bases ya existentes.
+
 -- Crear tabla usuarios si no existe
 CREATE TABLE IF NOT EXISTS usuarios (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -15,5 +18,89 @@ CREATE TABLE IF NOT EXISTS productos (
     descripcion TEXT,
     precio DECIMAL(10,2) NOT NULL DEFAULT 0,
     cantidad INT NOT NULL DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+    -- Se incrementa en cada escritura: ETag del producto y control optimista con If-Match
+    version INT NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Última escritura y eliminación lógica: GET /productos/changes y /productos/events.
+    -- Una fila eliminada queda como lápida (deleted_at) hasta que la purga la borra.
+    updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    deleted_at TIMESTAMP(6) NULL DEFAULT NULL,
+    INDEX idx_productos_cambios (updated_at, id),
+    INDEX idx_productos_eliminados (deleted_at),
+    -- Índices para la paginación por cursor (orden, id) y los filtros de GET /productos
+    INDEX idx_productos_precio (precio, id),
+    INDEX idx_productos_cantidad (cantidad, id),
+    INDEX idx_productos_nombre (nombre, id),
+    -- Búsqueda por texto de GET /productos/search (relevancia sin recorrer la tabla)
+    FULLTEXT INDEX ft_productos_texto (nombre, descripcion)
+);
+-- Resumen de inventario para GET /productos/stats, mantenido por triggers con deltas.
+-- Cada fila agrega los productos de un tramo de precio dentro de un slot (id % 16):
+-- repartir en slots evita que todas las escrituras compitan por la misma fila.
+CREATE TABLE IF NOT EXISTS productos_resumen (
+    slot TINYINT NOT NULL,
+    rango TINYINT NOT NULL,
+    productos INT NOT NULL DEFAULT 0,
+    unidades BIGINT NOT NULL DEFAULT 0,
+    valor DECIMAL(20,2) NOT NULL DEFAULT 0,
+    bajo_stock INT NOT NULL DEFAULT 0,
+    sin_stock INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (slot, rango)
+);
+
+DELIMITER $$
+
+-- Tramos de precio (las etiquetas están en backend/resumen.py)
+CREATE FUNCTION rango_precio(p DECIMAL(10,2)) RETURNS TINYINT DETERMINISTIC NO SQL
+RETURN CASE
+    WHEN p < 10 THEN 0
+    WHEN p < 50 THEN 1
+    WHEN p < 100 THEN 2
+    WHEN p < 500 THEN 3
+    WHEN p < 1000 THEN 4
+    ELSE 5
+END$$
+
+-- Suma (signo = 1) o resta (signo = -1) un producto del resumen.
+-- El umbral de bajo stock (5) debe coincidir con STOCK_BAJO en backend/resumen.py
+CREATE PROCEDURE resumen_sumar(p_id INT, p_precio DECIMAL(10,2), p_cantidad INT, signo INT)
+BEGIN
+    INSERT INTO productos_resumen (slot, rango, productos, unidades, valor, bajo_stock, sin_stock)
+    VALUES (p_id % 16, rango_precio(p_precio), signo, signo * p_cantidad, signo * p_precio * p_cantidad,
+            signo * (p_cantidad <= 5), signo * (p_cantidad <= 0)) AS d
+    ON DUPLICATE KEY UPDATE
+        productos = productos_resumen.productos + d.productos,
+        unidades = productos_resumen.unidades + d.unidades,
+        valor = productos_resumen.valor + d.valor,
+        bajo_stock = productos_resumen.bajo_stock + d.bajo_stock,
+        sin_stock = productos_resumen.sin_stock + d.sin_stock;
+END$$
+
+CREATE TRIGGER productos_resumen_insert AFTER INSERT ON productos FOR EACH ROW
+BEGIN
+    CALL resumen_sumar(NEW.id, NEW.precio, NEW.cantidad, 1);
+END$$
+
+CREATE TRIGGER productos_resumen_update AFTER UPDATE ON productos FOR EACH ROW
+BEGIN
+    -- La eliminación lógica (deleted_at) cuenta como un borrado;
+    -- cambios de nombre o descripción no tocan el resumen
+    IF OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL THEN
+        CALL resumen_sumar(OLD.id, OLD.precio, OLD.cantidad, -1);
+    ELSEIF OLD.deleted_at IS NOT NULL AND NEW.deleted_at IS NULL THEN
+        CALL resumen_sumar(NEW.id, NEW.precio, NEW.cantidad, 1);
+    ELSEIF NEW.deleted_at IS NULL AND (NEW.precio <> OLD.precio OR NEW.cantidad <> OLD.cantidad) THEN
+        CALL resumen_sumar(OLD.id, OLD.precio, OLD.cantidad, -1);
+        CALL resumen_sumar(NEW.id, NEW.precio, NEW.cantidad, 1);
+    END IF;
+END$$
+
+CREATE TRIGGER productos_resumen_delete AFTER DELETE ON productos FOR EACH ROW
+BEGIN
+    -- Purgar una lápida no cambia el resumen: ya se restó al eliminarla
+    IF OLD.deleted_at IS NULL THEN
+        CALL resumen_sumar(OLD.id, OLD.precio, OLD.cantidad, -1);
+    END IF;
+END$$
+
+DELIMITER ;
@@ -25,6 +25,7 @@ export class LoginComponent {
       next: (response) => {
         alert('Inicio de sesión exitoso');
         localStorage.setItem('usuario', JSON.stringify(response.usuario));
+        localStorage.setItem('token', response.token); // sesión firmada por el backend
         this.router.navigate(['/productos']); // redirige al CRUD después del login
       },
       error: (err) => {
@@ -1,7 +1,7 @@
 // Pega este contenido en src/app/components/productos/productos.component.ts
 
-import { Component, OnInit } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
+import { Component, OnDestroy, OnInit } from '@angular/core';
+import { HttpClient, HttpParams } from '@angular/common/http';
 
 interface Producto {
   id?: number;
@@ -9,6 +9,7 @@ interface Producto {
   descripcion?: string;
   precio: number;
   cantidad: number;
+  version?: number;
 }
 
 @Component({
@@ -16,21 +17,65 @@ interface Producto {
   templateUrl: './productos.component.html',
   styleUrls: ['./productos.component.scss']
 })
-export class ProductosComponent implements OnInit {
+export class ProductosComponent implements OnInit, OnDestroy {
+  private static readonly TAMANO_PAGINA = 500; // Máximo que acepta GET /productos
   productos: Producto[] = [];
   nuevoProducto: Producto = { nombre: '', descripcion: '', precio: 0, cantidad: 0 };
 
   private apiUrl = 'http://localhost:3000/productos'; 
+  private eventos?: EventSource;
 
   constructor(private http: HttpClient) {}
 
   ngOnInit(): void {
-    this.obtenerProductos();
+    // Primero el token de ahora, después la lista completa y los eventos desde ese token:
+    // así no se pierde ningún cambio hecho mientras se descargaba la lista
+    this.http.get<{ token: string }>(`${this.apiUrl}/changes`).subscribe({
+      next: ({ token }) => {
+        this.obtenerProductos();
+        this.escucharCambios(token);
+      },
+      error: (err) => console.error('Error al obtener el token de cambios:', err)
+    });
+  }
+
+  ngOnDestroy(): void {
+    this.eventos?.close();
   }
 
-  obtenerProductos() {
-    this.http.get<Producto[]>(this.apiUrl).subscribe({
-      next: (data) => (this.productos = data),
+  // Altas, modificaciones y eliminaciones de cualquier usuario, sin recargar la tabla
+  escucharCambios(token: string) {
+    this.eventos = new EventSource(`${this.apiUrl}/events?since=${encodeURIComponent(token)}`);
+    const guardar = (evento: MessageEvent) => this.aplicarCambio(JSON.parse(evento.data));
+    this.eventos.addEventListener('create', guardar);
+    this.eventos.addEventListener('update', guardar);
+    this.eventos.addEventListener('delete', (evento: MessageEvent) => this.quitarProducto(JSON.parse(evento.data).id));
+  }
+
+  aplicarCambio(cambio: Producto) {
+    const i = this.productos.findIndex((p) => p.id === cambio.id);
+    if (i === -1) {
+      this.productos.push(cambio);
+    } else if ((this.productos[i].version ?? 0) <= (cambio.version ?? 0)) {
+      this.productos[i] = { ...this.productos[i], ...cambio };
+    }
+  }
+
+  quitarProducto(id?: number) {
+    this.productos = this.productos.filter((p) => p.id !== id);
+  }
+
+  // La API devuelve la lista por páginas: se sigue X-Next-Cursor hasta que no venga
+  obtenerProductos(after?: string) {
+    let params = new HttpParams().set('limit', ProductosComponent.TAMANO_PAGINA);
+    if (after) params = params.set('after', after);
+    this.http.get<Producto[]>(this.apiUrl, { params, observe: 'response' }).subscribe({
+      next: (respuesta) => {
+        // aplicarCambio conserva la versión más nueva si un evento llegó antes que la página
+        (respuesta.body ?? []).forEach((producto) => this.aplicarCambio(producto));
+        const siguiente = respuesta.headers.get('X-Next-Cursor');
+        if (siguiente) this.obtenerProductos(siguiente);
+      },
       error: (err) => console.error('Error al obtener productos:', err)
     });
   }
@@ -38,7 +83,7 @@ export class ProductosComponent implements OnInit {
   agregarProducto() {
     this.http.post<Producto>(this.apiUrl, this.nuevoProducto).subscribe({
       next: (data) => {
-        this.productos.push(data);
+        this.aplicarCambio(data);
         this.nuevoProducto = { nombre: '', descripcion: '', precio: 0, cantidad: 0 };
       },
       error: (err) => console.error('Error al agregar producto:', err)
@@ -77,10 +122,10 @@ export class ProductosComponent implements OnInit {
     };
 
     // Enviar la solicitud PUT
-    this.http.put(`${this.apiUrl}/${producto.id}`, actualizado).subscribe({
-      next: () => {
+    this.http.put<Producto>(`${this.apiUrl}/${producto.id}`, actualizado).subscribe({
+      next: (data) => {
           alert(`Producto "${nuevoNombre}" actualizado con éxito.`);
-          this.obtenerProductos(); 
+          this.aplicarCambio(data); // La respuesta ya trae el producto: no hace falta recargar la lista
       },
       error: (err) => console.error('Error al editar producto:', err)
     });
@@ -89,7 +134,7 @@ export class ProductosComponent implements OnInit {
   eliminarProducto(id?: number) {
     if (!id || !confirm('¿Seguro que deseas eliminar este producto?')) return;
     this.http.delete(`${this.apiUrl}/${id}`).subscribe({
-      next: () => this.obtenerProductos(),
+      next: () => this.quitarProducto(id),
       error: (err) => console.error('Error al eliminar producto:', err)
     });
   }